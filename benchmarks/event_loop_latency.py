@@ -0,0 +1,82 @@
+'''Event loop latency while handlers run slow queries.
+
+Compares the synchronous session (what `orm_function` gives the bot
+handlers) with the AsyncSession used by `async_orm_function`.
+
+    python -m benchmarks.event_loop_latency --handlers 10
+'''
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from typing import Awaitable, Callable, List
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+
+SLOW_QUERY = text(
+    'WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c '
+    'WHERE x < :size) SELECT count(*) FROM c'
+)
+TICK = 0.01
+
+
+async def measure_lag(
+    handler: Callable[[], Awaitable[None]], handlers: int
+) -> List[float]:
+    lags: List[float] = []
+    done = asyncio.Event()
+
+    async def ticker() -> None:
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(TICK)
+            lags.append(time.perf_counter() - started - TICK)
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.gather(*(handler() for _ in range(handlers)))
+    done.set()
+    await ticker_task
+    return lags
+
+
+def report(name: str, lags: List[float], elapsed: float) -> None:
+    print(
+        f'{name:>6}: wall {elapsed:6.2f}s  '
+        f'lag avg {statistics.mean(lags) * 1000:7.1f}ms  '
+        f'max {max(lags) * 1000:7.1f}ms  ticks {len(lags)}'
+    )
+
+
+async def main(handlers: int, size: int) -> None:
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    sync_engine = create_engine(f'sqlite:///{path}')
+    async_engine = create_async_engine(f'sqlite+aiosqlite:///{path}')
+
+    async def sync_handler() -> None:
+        with Session(sync_engine) as session:
+            session.execute(SLOW_QUERY, {'size': size}).scalar()
+        await asyncio.sleep(0)
+
+    async def async_handler() -> None:
+        async with AsyncSession(async_engine) as session:
+            await session.execute(SLOW_QUERY, {'size': size})
+
+    for name, handler in (('sync', sync_handler), ('async', async_handler)):
+        started = time.perf_counter()
+        lags = await measure_lag(handler, handlers)
+        report(name, lags, time.perf_counter() - started)
+
+    await async_engine.dispose()
+    sync_engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--handlers', type=int, default=10)
+    parser.add_argument('--size', type=int, default=1_000_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.handlers, args.size))
@@ -0,0 +1,83 @@
+'''Peak RSS of a full semester import kept in memory.
+
+Parses a set of synthetic workbooks into one result, the way the parser
+command does before writing to the database, and reports the peak
+resident set size of the process. Run it once per variant: the peak of a
+process never goes down.
+
+    python -m benchmarks.import_memory --files 30
+'''
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+from benchmarks.workbook import write_workbook
+from schedule_bot.updater.parse import Parser
+
+
+def peak_rss() -> int:
+    '''Peak resident set size of this process in bytes.'''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def write_workbooks(files: int, sheets: int, groups: int) -> List[str]:
+    directory = tempfile.mkdtemp()
+    paths = [os.path.join(directory, f'{i}.xls') for i in range(files)]
+    # written by other processes so that xlwt does not raise our peak
+    with ProcessPoolExecutor() as executor:
+        futures = [
+            executor.submit(
+                write_workbook,
+                path,
+                sheets,
+                groups,
+                seed=file_id,
+                first_group=file_id * sheets * groups,
+            )
+            for file_id, path in enumerate(paths)
+        ]
+        for future in futures:
+            future.result()
+    return paths
+
+
+def main(files: int, sheets: int, groups: int, keep_raw: bool) -> None:
+    paths = write_workbooks(files, sheets, groups)
+
+    before = peak_rss()
+    started = time.perf_counter()
+    parser = Parser(keep_raw=keep_raw)
+    for path in paths:
+        parser.parse_file(path)
+    elapsed = time.perf_counter() - started
+
+    result = parser.result
+    print(
+        f'{files} files, {len(result.groups)} groups, '
+        f'{result.counter.total} lessons in {elapsed:.2f}s'
+    )
+    print(
+        f'peak RSS {peak_rss() / 2 ** 20:.1f} MiB '
+        f'(+{(peak_rss() - before) / 2 ** 20:.1f} MiB while parsing)'
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=30)
+    parser.add_argument('--sheets', type=int, default=10)
+    parser.add_argument('--groups', type=int, default=30)
+    parser.add_argument(
+        '--keep-raw',
+        action='store_true',
+        help='keep the cell text of every lesson',
+    )
+    args = parser.parse_args()
+    main(args.files, args.sheets, args.groups, args.keep_raw)
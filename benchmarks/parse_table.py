@@ -0,0 +1,72 @@
+'''Sheet to matrix conversion speed of `parse_table`.
+
+Builds a synthetic workbook with `benchmarks.workbook` and compares the
+current `parse_table` with the previous cell by cell implementation.
+
+    python -m benchmarks.parse_table --sheets 20 --groups 40
+'''
+import argparse
+import os
+import tempfile
+import time
+from typing import Callable, Dict
+
+import numpy as np
+import xlrd
+
+from benchmarks.workbook import write_workbook
+from schedule_bot.updater.parse import parse_table
+
+
+def parse_table_cells(tablename: str) -> Dict[str, np.ndarray]:
+    '''The previous implementation, kept for comparison.'''
+    data = xlrd.open_workbook(tablename, formatting_info=True)
+    mats = {}
+    for sheet_id in range(data.nsheets):
+        sheet = data.sheet_by_index(sheet_id)
+        mat: np.ndarray = np.empty((sheet.ncols, sheet.nrows), object)
+        for ncol in range(sheet.ncols):
+            for nrow in range(sheet.nrows):
+                mat[ncol][nrow] = sheet[nrow][ncol].value
+        for (x0, x1, y0, y1) in sheet.merged_cells:
+            cell_data = sheet[x0][y0].value
+            for x in range(x0, x1):
+                for y in range(y0, y1):
+                    mat[y][x] = cell_data
+        mats[sheet.name] = mat
+    return mats
+
+
+def measure(
+    func: Callable[[str], Dict[str, np.ndarray]], path: str, repeat: int
+) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(path)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(sheets: int, groups: int, repeat: int) -> None:
+    path = os.path.join(tempfile.mkdtemp(), 'bench.xls')
+    write_workbook(path, sheets, groups)
+
+    expected = list(parse_table_cells(path).values())
+    actual = list(parse_table(path).values())
+    assert all(np.array_equal(a, b) for a, b in zip(expected, actual))
+
+    cells = measure(parse_table_cells, path, repeat)
+    vectorized = measure(parse_table, path, repeat)
+    print(f'{sheets} sheets x {groups} groups x 85 rows')
+    print(f'cell by cell: {cells:7.3f}s')
+    print(f'vectorized:   {vectorized:7.3f}s  ({cells / vectorized:.1f}x)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sheets', type=int, default=20)
+    parser.add_argument('--groups', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    main(args.sheets, args.groups, args.repeat)
@@ -0,0 +1,180 @@
+'''Parser benchmarks on a synthetic workbook.
+
+Times `parse_table`, `parse_sheet` and `parse_lesson_exp` separately and
+records the best time, throughput and peak memory of each to a JSON file.
+The lesson caches are cleared before every run, so the numbers are those
+of a workbook the parser has not seen yet.
+
+    python -m benchmarks.parser --output before.json
+    python -m benchmarks.parser --output after.json --compare before.json
+'''
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.workbook import write_workbook
+from schedule_bot.updater.parse import (
+    CACHED_FUNCTIONS,
+    LESSONS_PER_WEEK,
+    Parser,
+    find_groups,
+    is_filled,
+    parse_lesson_exp,
+    parse_table,
+)
+
+
+def clear_caches() -> None:
+    for func in CACHED_FUNCTIONS.values():
+        func.cache_clear()
+
+
+def lesson_cells(sheets: List[np.ndarray]) -> List[str]:
+    '''Every lesson cell under a group header, merged ones repeated.'''
+    cells = []
+    for sheet in sheets:
+        for x, y, _ in find_groups(sheet):
+            column = sheet[x, y + 1:y + 1 + LESSONS_PER_WEEK]
+            cells.extend(column[is_filled(column).astype(bool)])
+    return cells
+
+
+def measure(
+    func: Callable[[], Any], items: int, unit: str, repeat: int
+) -> Dict[str, Any]:
+    times = []
+    for _ in range(repeat):
+        clear_caches()
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+
+    # tracing slows the code down, so memory is measured in its own run
+    clear_caches()
+    tracemalloc.start()
+    func()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    best = min(times)
+    return {
+        'best': best,
+        'mean': statistics.mean(times),
+        'repeat': repeat,
+        'items': items,
+        'unit': unit,
+        'throughput': items / best,
+        'peak_memory': peak_memory,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+    sheets: int, groups: int, fill: float, seed: int, repeat: int
+) -> Dict[str, Any]:
+    path = os.path.join(tempfile.mkdtemp(), 'bench.xls')
+    write_workbook(path, sheets, groups, fill, seed)
+
+    matrices = list(parse_table(path).values())
+    cells = sum(matrix.size for matrix in matrices)
+    lessons = lesson_cells(matrices)
+
+    def parse_sheets() -> None:
+        parser = Parser()
+        for matrix in matrices:
+            parser.parse_sheet(matrix)
+
+    def parse_lessons() -> None:
+        for lesson in lessons:
+            parse_lesson_exp(lesson)
+
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'workbook': {
+            'sheets': sheets,
+            'groups': groups,
+            'fill': fill,
+            'seed': seed,
+            'cells': cells,
+            'lessons': len(lessons),
+        },
+        'benchmarks': {
+            'parse_table': measure(
+                lambda: parse_table(path), cells, 'cells', repeat
+            ),
+            'parse_sheet': measure(
+                parse_sheets, len(lessons), 'lessons', repeat
+            ),
+            'parse_lesson_exp': measure(
+                parse_lessons, len(lessons), 'lessons', repeat
+            ),
+        },
+    }
+
+
+def report(
+    results: Dict[str, Any], baseline: Optional[Dict[str, Any]]
+) -> None:
+    workbook = results['workbook']
+    print(
+        f"{workbook['sheets']} sheets x {workbook['groups']} groups, "
+        f"{workbook['lessons']} lessons, commit {results['commit']}"
+    )
+    for name, result in results['benchmarks'].items():
+        line = (
+            f"{name:>16}: {result['best']:7.3f}s  "
+            f"{result['throughput']:10.0f} {result['unit']}/s  "
+            f"peak {result['peak_memory'] / 2 ** 20:7.1f} MiB"
+        )
+        if baseline is not None and name in baseline['benchmarks']:
+            old = baseline['benchmarks'][name]
+            line += (
+                f"  time x{result['best'] / old['best']:.2f}"
+                f"  memory x{result['peak_memory'] / old['peak_memory']:.2f}"
+            )
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sheets', type=int, default=10)
+    parser.add_argument('--groups', type=int, default=30)
+    parser.add_argument('--fill', type=float, default=0.4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write the results to a JSON file')
+    parser.add_argument(
+        '--compare', help='JSON results of an earlier run to compare with'
+    )
+    args = parser.parse_args()
+
+    results = run(args.sheets, args.groups, args.fill, args.seed, args.repeat)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+    report(results, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
@@ -0,0 +1,85 @@
+'''Latency of `Schedule.now`, the reply to the "now" button.
+
+Loads a snapshot of a synthetic timetable from an in-memory database and
+times `now` for random groups.
+
+    python -m benchmarks.schedule_now --groups 1000 --runs 100000
+'''
+import argparse
+import random
+import timeit
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from schedule_bot import Base, db
+from schedule_bot.schedule import Schedule
+from schedule_bot.snapshot import ScheduleSnapshot
+
+LESSONS_PER_DAY = 7
+
+
+def group_name(group_id: int) -> str:
+    return f'Б22-{group_id // 4:03}-{group_id % 4 + 1}'
+
+
+def make_snapshot(groups: int, seed: int) -> ScheduleSnapshot:
+    rng = random.Random(seed)
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as session:
+        version = db.ScheduleVersion(active=True)
+        lesson = db.Lesson('Программирование')
+        session.add_all([version, lesson])
+        session.flush()
+        for group_id in range(groups):
+            group = db.Group(group_name(group_id))
+            session.add(group)
+            session.flush()
+            rows = [
+                db.Schedule(
+                    group.id,
+                    lesson.id,
+                    None,
+                    None,
+                    num,
+                    weekday,
+                    overline,
+                    '122в',
+                    generation=version.id,
+                )
+                for weekday in range(6)
+                for overline in (True, False)
+                for num in range(1, LESSONS_PER_DAY + 1)
+                if rng.random() < 0.5
+            ]
+            session.add_all(rows)
+        session.commit()
+
+        snapshot = ScheduleSnapshot()
+        snapshot.reload(session=session)
+    engine.dispose()
+    return snapshot
+
+
+def main(groups: int, runs: int, seed: int) -> None:
+    schedule = Schedule(make_snapshot(groups, seed))
+    rng = random.Random(seed)
+    names = [group_name(group_id) for group_id in range(groups)]
+
+    elapsed = timeit.timeit(
+        lambda: schedule.now(rng.choice(names)), number=runs
+    )
+    print(
+        f'{groups} groups, {runs} calls: '
+        f'{elapsed / runs * 1e6:.1f}us per call'
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--groups', type=int, default=1000)
+    parser.add_argument('--runs', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    main(args.groups, args.runs, args.seed)
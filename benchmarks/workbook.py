@@ -0,0 +1,157 @@
+'''Synthetic workbooks shaped like the ISTU timetables.
+
+Every sheet has the weekdays and lesson numbers in the first two columns
+and a group per column after them: a header like "Б22-191-1\nИВТ" and 84
+lesson rows. Lectures are merged across a stream of groups, lessons held
+every week are merged over and under the line, and the lesson text has
+the noise of the real files (titles, line breaks, subgroups, odd rooms).
+
+    python -m benchmarks.workbook bench.xls --sheets 10 --groups 30
+'''
+import argparse
+import random
+from typing import List
+
+import xlwt
+
+from schedule_bot.updater.parse import LESSONS_PER_WEEK
+
+WEEKDAYS = [
+    'Понедельник',
+    'Вторник',
+    'Среда',
+    'Четверг',
+    'Пятница',
+    'Суббота',
+]
+LESSONS_PER_DAY = 7
+STREAM = 4
+
+SUBJECTS = [
+    'Программирование',
+    'Математический анализ',
+    'Основы программирования на С++',
+    'Дискретная математика',
+    'Физика',
+    'История России',
+    'Иностранный язык',
+    'Базы данных',
+    'Мастер-класс "Реклама и связи с общественностью"',
+    'Теория вероятностей и математическая статистика',
+]
+AUTHORS = [
+    'Вдовин А.Ю.',
+    'Кайсина И.А.',
+    'Чукавин С.И.',
+    'Титова О.В.',
+    'доц. Иванов П.С.',
+    'проф. Петрова Е.Н.',
+    'пр. Сидоров К.Л.',
+]
+ROOMS = [
+    '122в',
+    '5-302',
+    '1-301',
+    '3-108а',
+    'к.7-404',
+    'ЭОиДОТ',
+    '(ee.istu.ru)',
+]
+LECTURES = ['лекц', 'лекция', 'лек.']
+CLASSES = ['практ', 'практика', 'л/р', 'лаб.', 'л/р 1 п/гр', 'практ 2 п/гр']
+SPORT = 'Физическая культура и спорт'
+
+
+def lesson_text(rng: random.Random, lesson_type: str) -> str:
+    department = rng.randint(10, 99)
+    if rng.random() < 0.05:
+        return f'({department}) ({lesson_type}) {SPORT}'
+    subject = rng.choice(SUBJECTS)
+    separator = rng.choice([', ', ',  ', ',\n', ' '])
+    # a few cells miss the teacher or the room
+    author = '' if rng.random() < 0.03 else rng.choice(AUTHORS)
+    room = '' if rng.random() < 0.03 else rng.choice(ROOMS)
+    return (
+        f'({department}) ({lesson_type}) {subject}{separator}{author}, {room}'
+    )
+
+
+def write_sheet(
+    sheet: xlwt.Worksheet,
+    rng: random.Random,
+    first_group: int,
+    groups: int,
+    fill: float,
+) -> None:
+    for day, weekday in enumerate(WEEKDAYS):
+        row = 1 + day * LESSONS_PER_DAY * 2
+        sheet.write_merge(row, row + LESSONS_PER_DAY * 2 - 1, 0, 0, weekday)
+        for num in range(LESSONS_PER_DAY):
+            sheet.write_merge(row + num * 2, row + num * 2 + 1, 1, 1, num + 1)
+
+    for col in range(2, groups + 2):
+        group_id = first_group + col - 2
+        year = 22 - group_id // 4000
+        group = f'Б{year}-{group_id // 4 % 1000:03}-{group_id % 4 + 1}'
+        sheet.write(0, col, f'{group}\nИВТ')
+
+    # cells already covered by a merged range
+    taken: List[List[bool]] = [
+        [False] * (groups + 2) for _ in range(LESSONS_PER_WEEK + 1)
+    ]
+    for row in range(1, LESSONS_PER_WEEK + 1, 2):
+        for stream in range(2, groups + 2, STREAM):
+            last = min(stream + STREAM - 1, groups + 1)
+            if rng.random() < fill / 3:
+                # a lecture of the whole stream, sometimes every week
+                height = 2 if rng.random() < 0.5 else 1
+                sheet.write_merge(
+                    row,
+                    row + height - 1,
+                    stream,
+                    last,
+                    lesson_text(rng, rng.choice(LECTURES)),
+                )
+                for taken_row in taken[row:row + height]:
+                    taken_row[stream:last + 1] = [True] * (last + 1 - stream)
+        for col in range(2, groups + 2):
+            for line in (row, row + 1):
+                if taken[line][col] or rng.random() >= fill:
+                    continue
+                text = lesson_text(rng, rng.choice(CLASSES))
+                if line == row and rng.random() < 0.3:
+                    # the same class over and under the line
+                    taken[line + 1][col] = True
+                    sheet.write_merge(line, line + 1, col, col, text)
+                else:
+                    sheet.write(line, col, text)
+
+
+def write_workbook(
+    path: str,
+    sheets: int = 10,
+    groups: int = 30,
+    fill: float = 0.4,
+    seed: int = 0,
+    first_group: int = 0,
+) -> None:
+    '''`fill` is the share of lesson cells that are not empty.'''
+    rng = random.Random(seed)
+    workbook = xlwt.Workbook()
+    for sheet_id in range(sheets):
+        sheet = workbook.add_sheet(f'sheet{sheet_id}')
+        write_sheet(
+            sheet, rng, first_group + sheet_id * groups, groups, fill
+        )
+    workbook.save(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path')
+    parser.add_argument('--sheets', type=int, default=10)
+    parser.add_argument('--groups', type=int, default=30)
+    parser.add_argument('--fill', type=float, default=0.4)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    write_workbook(args.path, args.sheets, args.groups, args.fill, args.seed)
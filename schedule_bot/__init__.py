@@ -5,12 +5,19 @@ from typing import List
 
 import toml
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession as AsyncSessionBase
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 from schedule_bot.utils.configure import Configure
 
 WORKDIR = Path(__file__).parent.parent
 
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
 logging.config.fileConfig(
     WORKDIR / 'logger.conf', disable_existing_loggers=False
 )
@@ -36,6 +43,11 @@ DB_HOST: str = configure.get_option(
 DB_DRIVER: str = configure.get_option(
     None, 'DB_DRIVER', ('db', 'driver'), not_none=True
 )
+DB_ASYNC_DRIVER: str = configure.get_option(
+    ASYNC_DRIVERS.get(DB_DRIVER, DB_DRIVER),
+    'DB_ASYNC_DRIVER',
+    ('db', 'async_driver'),
+)
 WEATHER_LOCATION: int = configure.get_option(
     296181, 'WEATHER_LOCATION', ('tools', 'weather', 'location')
 )
@@ -43,9 +55,52 @@ BOT_ADMINS: List[int] = configure.get_option([], config_path=('bot', 'admins'))
 BOT_SKIP_UPDATES: bool = configure.get_option(
     False, 'BOT_SKIP_UPDATES', ('bot', 'skip_updates')
 )
+BROADCAST_RATE: float = float(
+    configure.get_option(30, 'BROADCAST_RATE', ('bot', 'broadcast', 'rate'))
+)
+BROADCAST_WORKERS: int = int(
+    configure.get_option(
+        8, 'BROADCAST_WORKERS', ('bot', 'broadcast', 'workers')
+    )
+)
+BROADCAST_CHAT_INTERVAL: float = float(
+    configure.get_option(
+        1.0, 'BROADCAST_CHAT_INTERVAL', ('bot', 'broadcast', 'chat_interval')
+    )
+)
+BROADCAST_CHECKPOINT: int = int(
+    configure.get_option(
+        10, 'BROADCAST_CHECKPOINT', ('bot', 'broadcast', 'checkpoint')
+    )
+)
+USER_CACHE_SIZE: int = int(
+    configure.get_option(10000, 'USER_CACHE_SIZE', ('cache', 'users', 'size'))
+)
+USER_CACHE_TTL: int = int(
+    configure.get_option(600, 'USER_CACHE_TTL', ('cache', 'users', 'ttl'))
+)
+USER_CACHE_REDIS: bool = configure.get_option(
+    False, 'USER_CACHE_REDIS', ('cache', 'users', 'redis')
+)
+DOWNLOAD_CONCURRENCY: int = int(
+    configure.get_option(
+        4, 'DOWNLOAD_CONCURRENCY', ('updater', 'download', 'concurrency')
+    )
+)
+DOWNLOAD_RETRIES: int = int(
+    configure.get_option(
+        3, 'DOWNLOAD_RETRIES', ('updater', 'download', 'retries')
+    )
+)
 
 DB_URL = f'{DB_DRIVER}://{DB_HOST}'
+ASYNC_DB_URL = f'{DB_ASYNC_DRIVER}://{DB_HOST}'
 
 engine = create_engine(DB_URL)
 Base = declarative_base()
 Session = sessionmaker(bind=engine, expire_on_commit=False)
+
+async_engine = create_async_engine(ASYNC_DB_URL)
+AsyncSession = sessionmaker(
+    bind=async_engine, class_=AsyncSessionBase, expire_on_commit=False
+)
@@ -6,23 +6,29 @@ from typing import Any, List
 import aioschedule
 from aiogram import Bot, Dispatcher, exceptions, executor, types
 from aiogram.contrib.fsm_storage.redis import RedisStorage2
-from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
 from aiogram.utils.deep_linking import decode_payload, get_start_link
 from aiogram.utils.emoji import emojize
+from aioredis import Redis
 
 from schedule_bot import (
     BOT_ADMINS,
     BOT_SKIP_UPDATES,
+    BROADCAST_CHAT_INTERVAL,
+    BROADCAST_CHECKPOINT,
+    BROADCAST_RATE,
+    BROADCAST_WORKERS,
     REDIS_HOST,
     REDIS_PORT,
     TELEGRAM_KEY,
     WEATHER_LOCATION,
     logger,
 )
+from schedule_bot.bot.broadcast import Broadcaster
+from schedule_bot.bot.jobs import BroadcastQueue
 from schedule_bot.bot.keyboard import Keyboard
 from schedule_bot.bot.mailing import mailing_parser
-from schedule_bot.manager import manager
+from schedule_bot.manager import async_manager
 from schedule_bot.schedule import Schedule
 from schedule_bot.utils import weather
 from schedule_bot.utils.times import Times
@@ -41,6 +47,9 @@ dp = Dispatcher(bot, storage=redis)
 schedule = Schedule()
 
 keyboard = Keyboard()
+broadcast_queue = BroadcastQueue(
+    Redis(host=REDIS_HOST, port=REDIS_PORT), checkpoint=BROADCAST_CHECKPOINT
+)
 
 
 async def morning_greeting() -> None:
@@ -55,13 +64,17 @@ async def morning_greeting() -> None:
     '''
     )
     today_weather = await weather.get_weather(location=WEATHER_LOCATION)
-
-    for vip_user in manager.get_all_vip_users():
-        if vip_user.group is not None:
-            sch = schedule.today(vip_user.group)
-            message = message_template.format(
-                weekday=Times.today_weekday().lower(),
-                date=Times.today_date(),
+    weekday = Times.today_weekday().lower()
+    date = Times.today_date()
+
+    messages = []
+    vip_groups = await async_manager.get_vip_users_by_group()
+    for group, tids in vip_groups.items():
+        sch = schedule.today(group)
+        message = emojize(
+            message_template.format(
+                weekday=weekday,
+                date=date,
                 header='Сегодня у вас нет пар'
                 if len(sch) == 0
                 else 'Ваше расписание на сегодня:',
@@ -71,12 +84,20 @@ async def morning_greeting() -> None:
                 else '\n\n'.join(sch),
                 end='Хорошего дня!',
             )
-            await send_message_to_user(vip_user.tid, emojize(message))
-            await asyncio.sleep(0.05)
+        )
+        messages.extend((tid, message) for tid in tids)
+
+    logger.info(
+        'Morning greeting: %d messages for %d groups',
+        len(messages),
+        len(vip_groups),
+    )
+    job_id = await broadcast_queue.create(messages, name='greeting')
+    await broadcast_queue.drain(job_id, broadcaster)
 
 
 async def add_user_critical(user_id: int) -> None:
-    manager.add_user(user_id)
+    await async_manager.add_user(user_id)
     await States.REGISTER.set()
     await bot.send_message(
         user_id,
@@ -105,10 +126,9 @@ async def send_message_to_user(
         logger.error(f'Sending [ID:{user_id}]: invalid user ID')
     except exceptions.RetryAfter as e:
         logger.error(
-            f'Sending [ID:{user_id}]: Flood limit is exceeded. Sleep {e.timeout} seconds.'
+            f'Sending [ID:{user_id}]: Flood limit is exceeded. Retry in {e.timeout} seconds.'
         )
-        await asyncio.sleep(e.timeout)
-        return await send_message_to_user(user_id, message)  # Recursive call
+        raise  # the broadcaster pauses every sender and retries
     except exceptions.UserDeactivated:
         logger.error(f'Sending [ID:{user_id}]: user is deactivated')
     except exceptions.TelegramAPIError:
@@ -119,6 +139,14 @@ async def send_message_to_user(
     return False
 
 
+broadcaster = Broadcaster(
+    send_message_to_user,
+    rate=BROADCAST_RATE,
+    workers=BROADCAST_WORKERS,
+    chat_interval=BROADCAST_CHAT_INTERVAL,
+)
+
+
 @dp.message_handler(commands=['help'], state='*')
 async def help_handler(msg: types.Message) -> None:
     await bot.send_message(msg.from_user.id, 'Nothing here yet')
@@ -127,18 +155,18 @@ async def help_handler(msg: types.Message) -> None:
 @dp.message_handler(commands=['start'], state='*')
 async def start_handler(msg: types.Message) -> None:
     user_id = msg.from_user.id
-    user = manager.get_user(user_id)
+    user = await async_manager.get_user_profile(user_id)
     args = msg.get_args()
     if args:  # invite link
         if user is None:
-            manager.add_user(user_id)
+            await async_manager.add_user(user_id)
         try:
             group = decode_payload(args)
-            ok = manager.group_exists(group)
+            ok = await async_manager.group_exists(group)
         except ValueError:
             ok = False
         if ok:
-            manager.set_user_group(user_id, group)
+            await async_manager.set_user_group(user_id, group)
             await States.IDLE.set()
             await bot.send_message(
                 user_id,
@@ -157,12 +185,12 @@ async def start_handler(msg: types.Message) -> None:
             await States.IDLE.set()
             await bot.send_message(
                 msg.from_user.id,
-                f'Снова здравствуйте!\nВаша группа: {user.group.group}',
+                f'Снова здравствуйте!\nВаша группа: {user.group}',
                 reply_markup=keyboard.IDLE_KEYBOARD,
             )
         else:
             if user is None:
-                manager.add_user(user_id)
+                await async_manager.add_user(user_id)
             await States.REGISTER.set()
             await bot.send_message(
                 msg.from_user.id,
@@ -174,11 +202,11 @@ async def start_handler(msg: types.Message) -> None:
 @dp.message_handler(commands=['invite'], state=States.IDLE)
 async def invite_handler(msg: types.Message) -> None:
     user_id = msg.from_user.id
-    user = manager.get_user(user_id)
+    user = await async_manager.get_user_profile(user_id)
     if user is None:
         await add_user_critical(user_id)
     else:
-        group: str = user.group.group
+        group: str = user.group
         invite_link = await get_start_link(payload=group, encode=True)
         await bot.send_message(
             user_id, invite_link, reply_markup=keyboard.IDLE_KEYBOARD
@@ -204,11 +232,11 @@ async def donate_handler(msg: types.Message) -> None:
 )
 async def today_handler(msg: types.Message) -> None:
     user_id = msg.from_user.id
-    user = manager.get_user(user_id)
+    user = await async_manager.get_user_profile(user_id)
     if user is None:
         await add_user_critical(user_id)
     else:
-        sch = schedule.today(user.group.group)
+        sch = schedule.today(user.group)
         message_top = f'{Times.today_weekday()}. {"Над" if schedule.is_overline() else "Под"} чертой.\n\n'
         if len(sch) == 0:
             await bot.send_message(
@@ -228,11 +256,11 @@ async def today_handler(msg: types.Message) -> None:
 @dp.message_handler(lambda msg: msg.text.lower() == 'завтра', state=States.IDLE)
 async def tomorrow_handler(msg: types.Message) -> None:
     user_id = msg.from_user.id
-    user = manager.get_user(user_id)
+    user = await async_manager.get_user_profile(user_id)
     if user is None:
         await add_user_critical(user_id)
     else:
-        sch = schedule.tomorrow(user.group.group)
+        sch = schedule.tomorrow(user.group)
         message_top = f'{Times.tomorrow_weekday()}. {"Над" if schedule.is_overline(add=1) else "Под"} чертой.\n\n'
         if len(sch) == 0:
             await bot.send_message(
@@ -252,7 +280,7 @@ async def tomorrow_handler(msg: types.Message) -> None:
 @dp.message_handler(lambda msg: msg.text.lower() == 'сейчас', state=States.IDLE)
 async def now_handler(msg: types.Message) -> None:
     user_id = msg.from_user.id
-    user = manager.get_user(user_id)
+    user = await async_manager.get_user_profile(user_id)
     if user is None:
         await add_user_critical(user_id)
     else:
@@ -268,7 +296,7 @@ async def now_handler(msg: types.Message) -> None:
 )
 async def schedule_handler(msg: types.Message) -> None:
     user_id = msg.from_user.id
-    user = manager.get_user(user_id)
+    user = await async_manager.get_user_profile(user_id)
     if user is None:
         await add_user_critical(user_id)
     else:
@@ -282,7 +310,7 @@ async def schedule_handler(msg: types.Message) -> None:
 @dp.message_handler(commands=['settings'], state='*')
 async def settings_handler(msg: types.Message) -> None:
     user_id = msg.from_user.id
-    keyboard = Keyboard.build_settings_keyboard(user_id)
+    keyboard = await Keyboard.build_settings_keyboard(user_id)
     await bot.send_message(user_id, 'Ваши настройки:', reply_markup=keyboard)
 
 
@@ -305,7 +333,7 @@ async def times_handler(msg: types.Message) -> None:
 @dp.message_handler(lambda msg: msg.text.lower() == 'выйти', state='*')
 async def quit_handler(msg: types.Message) -> None:
     user_id = msg.from_user.id
-    manager.drop_user_group(user_id)
+    await async_manager.drop_user_group(user_id)
     await States.REGISTER.set()
     await bot.send_message(
         user_id,
@@ -327,29 +355,23 @@ async def mailing_handler(msg: types.Message) -> None:
         for_all = args.all
         groups = args.groups
         message: str = args.message
-        count = 0
         if for_all:
-            all_users = manager.get_all_users()
-            try:
-                for user in all_users:
-                    if await send_message_to_user(user.tid, message):
-                        count += 1
-                    await asyncio.sleep(0.05)
-            finally:
-                await msg.reply(
-                    f'ok!\nотправлено пользователям: {count} из {len(all_users)}',
-                    reply_markup=keyboard.IDLE_KEYBOARD,
-                )
+            users = await async_manager.get_all_users()
         elif groups is not None and len(groups) > 0:
-            users = manager.get_users_in_groups(groups)
+            users = await async_manager.get_users_in_groups(groups)
+        else:
+            users = None
+
+        if users is not None:
+            job_id = await broadcast_queue.create(
+                ((user.tid, message) for user in users), name='mailing'
+            )
             try:
-                for user in users:
-                    if await send_message_to_user(user.tid, message):
-                        count += 1
-                    await asyncio.sleep(0.05)
+                await broadcast_queue.drain(job_id, broadcaster)
             finally:
+                stats = await broadcast_queue.progress(job_id)
                 await msg.reply(
-                    f'ok!\nотправлено пользователям: {count} из {len(users)}',
+                    f'ok!\n{stats}',
                     reply_markup=keyboard.IDLE_KEYBOARD,
                 )
         else:
@@ -359,13 +381,24 @@ async def mailing_handler(msg: types.Message) -> None:
             )
 
 
+@dp.message_handler(commands=['reload'], state='*')
+async def reload_handler(msg: types.Message) -> None:
+    user_id = msg.from_user.id
+    if user_id in ADMINS:
+        await schedule.snapshot.async_reload()
+        await msg.reply(
+            f'ok!\nрасписание обновлено (v{schedule.snapshot.version})',
+            reply_markup=keyboard.IDLE_KEYBOARD,
+        )
+
+
 @dp.message_handler(state=States.REGISTER)
 async def message_handler(msg: types.Message) -> None:
     user_id = msg.from_user.id
     group = msg.text
-    ok = manager.group_exists(group)
+    ok = await async_manager.group_exists(group)
     if ok:
-        manager.set_user_group(user_id, group)
+        await async_manager.set_user_group(user_id, group)
         await States.IDLE.set()
         await bot.send_message(
             user_id,
@@ -395,7 +428,7 @@ async def inline_back(callback: types.CallbackQuery) -> None:
 async def inline_group_list(callback: types.CallbackQuery) -> None:
     user_id = callback.from_user.id
     await bot.answer_callback_query(callback.id)
-    groups = sorted(manager.get_groups(), key=str)
+    groups = sorted(await async_manager.get_groups(), key=str)
     await bot.send_message(
         user_id,
         'Список групп:\n' + '\n'.join(map(str, groups)),
@@ -408,8 +441,10 @@ async def setting_setter_handler(callback: types.CallbackQuery) -> None:
     await bot.answer_callback_query(callback.id)
     _, option, value = callback.data.split('_')
     if option == 'vip':
-        manager.set_vip_status_by_telegram_id(user_id, bool(int(value)))
-    new_keyboard = Keyboard.build_settings_keyboard(user_id)
+        await async_manager.set_vip_status_by_telegram_id(
+            user_id, bool(int(value))
+        )
+    new_keyboard = await Keyboard.build_settings_keyboard(user_id)
     await bot.edit_message_text(
         'Ваши настройки:',
         chat_id=user_id,
@@ -420,13 +455,10 @@ async def setting_setter_handler(callback: types.CallbackQuery) -> None:
 
 # TODO split on multiply handlers
 @dp.callback_query_handler(state='*')
-async def process_schedule(
-    callback: types.CallbackQuery, state: FSMContext
-) -> None:
+async def process_schedule(callback: types.CallbackQuery) -> None:
     await bot.answer_callback_query(callback.id)
     day, line = int(callback.data[0]), int(callback.data[1])
     user_id = callback.from_user.id
-    user_state = await state.get_state()
     message_id = callback.message.message_id
     if day == 9:  # Time schedule
         await bot.edit_message_text(
@@ -443,49 +475,51 @@ async def process_schedule(
             reply_markup=keyboard.BACK_KEYBOARD,
         )
     else:
-        user = manager.get_user(user_id)
+        user = await async_manager.get_user_profile(user_id)
         if user is None:
             await add_user_critical(user_id)
+        elif user.group is not None:
+            await bot.edit_message_text(
+                schedule.day_message(user.group, day, bool(line)),
+                chat_id=user_id,
+                message_id=message_id,
+                reply_markup=keyboard.BACK_KEYBOARD,
+            )
         else:
-            if user_state == States.IDLE.state:
-                sch = schedule.day_schedule(user.group.group, day, bool(line))
-                message_top = f'{Times.weekdays[day]}. {"Над" if line else "Под"} чертой.\n\n'
-                if len(sch) == 0:
-                    await bot.edit_message_text(
-                        message_top + 'В этот день у вас нет пар',
-                        chat_id=user_id,
-                        message_id=message_id,
-                        reply_markup=keyboard.BACK_KEYBOARD,
-                    )
-                else:
-                    await bot.edit_message_text(
-                        message_top + '\n\n'.join(sch),
-                        chat_id=user_id,
-                        message_id=message_id,
-                        reply_markup=keyboard.BACK_KEYBOARD,
-                    )
-            else:
-                await bot.edit_message_text(
-                    'Вы ещё не указали свою группу!',
-                    chat_id=user_id,
-                    message_id=message_id,
-                    reply_markup=keyboard.BACK_KEYBOARD,
-                )
+            await bot.edit_message_text(
+                'Вы ещё не указали свою группу!',
+                chat_id=user_id,
+                message_id=message_id,
+                reply_markup=keyboard.BACK_KEYBOARD,
+            )
 
 
 async def morning_scheduler() -> None:
     aioschedule.every().day.at('8:00').do(morning_greeting)
+    aioschedule.every().minute.do(schedule.snapshot.async_refresh)
     while True:
         await aioschedule.run_pending()
         await asyncio.sleep(10)
 
 
+async def broadcast_resumer() -> None:
+    while True:
+        try:
+            await broadcast_queue.drain_all(broadcaster)
+        except Exception:
+            logger.exception('Broadcast resume failed')
+        await asyncio.sleep(30)
+
+
 async def setup(_: Any) -> None:
+    await schedule.snapshot.async_reload()
     asyncio.create_task(morning_scheduler())
+    asyncio.create_task(broadcast_resumer())
 
 
 async def shutdown(_: Any) -> None:
     await redis.close()
+    await broadcast_queue.redis.close()
 
 
 if __name__ == '__main__':
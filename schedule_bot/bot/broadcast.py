@@ -0,0 +1,184 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from aiogram.utils import exceptions
+
+from schedule_bot import logger
+
+SendFunction = Callable[[int, str], Awaitable[bool]]
+ResultCallback = Callable[[int, bool], Awaitable[None]]
+
+
+class TokenBucket:
+    '''Global send rate limiter shared by all broadcast workers.'''
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        # created in the running loop: on Python < 3.10 a lock binds to the
+        # loop that is current when it is created
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self) -> None:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class BroadcastStats:
+    def __init__(self, total: int = 0) -> None:
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+
+    @property
+    def done(self) -> int:
+        return self.sent + self.failed
+
+    def __str__(self) -> str:
+        return f'отправлено пользователям: {self.sent} из {self.total}'
+
+
+class Broadcaster:
+    '''Sends messages to many chats with a pool of concurrent workers.
+
+    All workers share one token bucket (Telegram allows about 30 messages
+    per second per bot) and keep at least `chat_interval` seconds between
+    two messages to the same chat. When any send hits `RetryAfter` every
+    worker pauses until the flood wait is over and the message is retried.
+    '''
+
+    def __init__(
+        self,
+        send: SendFunction,
+        rate: float = 30,
+        workers: int = 8,
+        chat_interval: float = 1.0,
+        max_retries: int = 5,
+        progress_every: int = 100,
+    ) -> None:
+        self.send = send
+        self.bucket = TokenBucket(rate)
+        self.workers = workers
+        self.chat_interval = chat_interval
+        self.max_retries = max_retries
+        self.progress_every = progress_every
+        self._paused_until = 0.0
+        self._chat_last_sent: Dict[int, float] = {}
+
+    def pause(self, timeout: float) -> None:
+        self._paused_until = max(
+            self._paused_until, time.monotonic() + timeout
+        )
+
+    async def _wait_turn(self, chat_id: int) -> None:
+        while True:
+            now = time.monotonic()
+            resume_at = max(
+                self._paused_until,
+                self._chat_last_sent.get(chat_id, 0.0) + self.chat_interval,
+            )
+            if resume_at > now:
+                await asyncio.sleep(resume_at - now)
+                continue
+            await self.bucket.acquire()
+            # another worker may have hit a flood wait meanwhile
+            if self._paused_until <= time.monotonic():
+                break
+        self._chat_last_sent[chat_id] = time.monotonic()
+
+    def _forget_chats(self) -> None:
+        '''Drops the chats whose interval is over.'''
+        expired = time.monotonic() - self.chat_interval
+        self._chat_last_sent = {
+            chat_id: sent
+            for chat_id, sent in self._chat_last_sent.items()
+            if sent > expired
+        }
+
+    async def _deliver(
+        self, chat_id: int, text: str, stats: BroadcastStats
+    ) -> bool:
+        for _ in range(self.max_retries + 1):
+            await self._wait_turn(chat_id)
+            try:
+                return await self.send(chat_id, text)
+            except exceptions.RetryAfter as e:
+                stats.retries += 1
+                self.pause(e.timeout)
+        return False
+
+    async def _worker(
+        self,
+        queue: 'asyncio.Queue[Tuple[int, str]]',
+        stats: BroadcastStats,
+        on_result: Optional[ResultCallback],
+    ) -> None:
+        while True:
+            try:
+                chat_id, text = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            ok = await self._deliver(chat_id, text, stats)
+            if ok:
+                stats.sent += 1
+            else:
+                stats.failed += 1
+            if on_result is not None:
+                await on_result(chat_id, ok)
+            if stats.done % self.progress_every == 0:
+                logger.info(
+                    'Broadcast progress: %d/%d (failed %d, retries %d)',
+                    stats.done,
+                    stats.total,
+                    stats.failed,
+                    stats.retries,
+                )
+
+    async def run(
+        self,
+        messages: Iterable[Tuple[int, str]],
+        stats: Optional[BroadcastStats] = None,
+        on_result: Optional[ResultCallback] = None,
+    ) -> BroadcastStats:
+        queue: 'asyncio.Queue[Tuple[int, str]]' = asyncio.Queue()
+        for message in messages:
+            queue.put_nowait(message)
+        if stats is None:
+            stats = BroadcastStats()
+        stats.total = queue.qsize()
+
+        started = time.monotonic()
+        try:
+            await asyncio.gather(
+                *(
+                    self._worker(queue, stats, on_result)
+                    for _ in range(min(self.workers, stats.total))
+                )
+            )
+        finally:
+            self._forget_chats()
+        logger.info(
+            'Broadcast finished: %d sent, %d failed, %d retries in %.1fs',
+            stats.sent,
+            stats.failed,
+            stats.retries,
+            time.monotonic() - started,
+        )
+        return stats
@@ -0,0 +1,256 @@
+import asyncio
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from schedule_bot import logger
+from schedule_bot.bot.broadcast import Broadcaster, BroadcastStats
+
+SENT = 'sent'
+FAILED = 'failed'
+
+
+class BroadcastQueue:
+    '''Broadcast jobs persisted in Redis.
+
+    A job keeps its recipients as a list of `tid:text_key` entries and each
+    distinct message text once. Processes claim batches of recipients by
+    moving a shared cursor with INCRBY, so several processes can drain one
+    job without sending to the same recipient twice. Every claimed batch is
+    protected by a lease key that its owner refreshes every third of the
+    lease for as long as the batch runs, flood waits included; when a
+    process dies the lease expires and another process resumes the batch,
+    skipping recipients whose delivery state is already stored. Delivery
+    state is written every `checkpoint` sends, so a crash can repeat at
+    most that many messages. Within a process a job is drained by one
+    caller at a time.
+    '''
+
+    prefix = 'broadcast_'
+
+    def __init__(
+        self,
+        redis: Any,
+        batch_size: int = 100,
+        checkpoint: int = 10,
+        lease: int = 300,
+        keep: int = 24 * 60 * 60,
+    ) -> None:
+        self.redis = redis
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint
+        self.lease = lease
+        self.keep = keep
+        # jobs drained by this process right now
+        self.running: Set[str] = set()
+
+    def __key(self, job_id: str, name: str) -> str:
+        return f'{self.prefix}{job_id}_{name}'
+
+    @property
+    def __jobs_key(self) -> str:
+        return f'{self.prefix}jobs'
+
+    async def create(
+        self, messages: Iterable[Tuple[int, str]], name: str = ''
+    ) -> str:
+        job_id = uuid.uuid4().hex
+        texts: Dict[str, str] = {}
+        text_keys: Dict[str, str] = {}
+        recipients: List[str] = []
+        for tid, text in messages:
+            if text not in text_keys:
+                text_keys[text] = str(len(text_keys))
+                texts[text_keys[text]] = text
+            recipients.append(f'{tid}:{text_keys[text]}')
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(
+                self.__key(job_id, 'meta'),
+                mapping={
+                    'name': name,
+                    'total': len(recipients),
+                    'created': time.time(),
+                },
+            )
+            if recipients:
+                pipe.hset(self.__key(job_id, 'texts'), mapping=texts)
+                pipe.rpush(self.__key(job_id, 'recipients'), *recipients)
+                pipe.sadd(
+                    self.__key(job_id, 'batches'),
+                    *range(0, len(recipients), self.batch_size),
+                )
+            pipe.sadd(self.__jobs_key, job_id)
+            await pipe.execute()
+
+        logger.info(
+            'Broadcast job %s (%s) created: %d recipients, %d texts',
+            job_id,
+            name,
+            len(recipients),
+            len(texts),
+        )
+        return job_id
+
+    async def active_jobs(self) -> List[str]:
+        jobs = await self.redis.smembers(self.__jobs_key)
+        return sorted(job.decode('utf-8') for job in jobs)
+
+    async def total(self, job_id: str) -> int:
+        total = await self.redis.hget(self.__key(job_id, 'meta'), 'total')
+        return int(total) if total is not None else 0
+
+    async def progress(self, job_id: str) -> BroadcastStats:
+        stats = BroadcastStats(await self.total(job_id))
+        for state in await self.redis.hvals(self.__key(job_id, 'state')):
+            if state == SENT.encode('utf-8'):
+                stats.sent += 1
+            else:
+                stats.failed += 1
+        return stats
+
+    async def _take_lease(self, job_id: str, start: int) -> bool:
+        return bool(
+            await self.redis.set(
+                self.__key(job_id, f'lease_{start}'),
+                1,
+                nx=True,
+                ex=self.lease,
+            )
+        )
+
+    async def _claim(self, job_id: str, total: int) -> Optional[int]:
+        '''Returns the start of a batch owned by this process.'''
+        cursor = int(await self.redis.get(self.__key(job_id, 'cursor')) or 0)
+        # batches handed out earlier whose owner stopped refreshing the lease
+        unfinished = await self.redis.sdiff(
+            self.__key(job_id, 'batches'), self.__key(job_id, 'done')
+        )
+        for start in sorted(int(batch) for batch in unfinished):
+            if start < cursor and await self._take_lease(job_id, start):
+                logger.info('Broadcast job %s: resume batch %d', job_id, start)
+                return start
+
+        while True:
+            end = await self.redis.incrby(
+                self.__key(job_id, 'cursor'), self.batch_size
+            )
+            start = end - self.batch_size
+            if start >= total:
+                return None
+            if await self._take_lease(job_id, start):
+                return start
+
+    async def _run_batch(
+        self,
+        job_id: str,
+        start: int,
+        broadcaster: Broadcaster,
+        texts: Dict[bytes, str],
+    ) -> BroadcastStats:
+        entries = await self.redis.lrange(
+            self.__key(job_id, 'recipients'),
+            start,
+            start + self.batch_size - 1,
+        )
+        recipients = [entry.split(b':') for entry in entries]
+        states = await self.redis.hmget(
+            self.__key(job_id, 'state'), [tid for tid, _ in recipients]
+        )
+        messages = [
+            (int(tid), texts[text_key])
+            for (tid, text_key), state in zip(recipients, states)
+            if state is None
+        ]
+
+        pending: Dict[int, str] = {}
+
+        async def flush() -> None:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                if pending:
+                    pipe.hset(self.__key(job_id, 'state'), mapping=pending)
+                pipe.expire(self.__key(job_id, f'lease_{start}'), self.lease)
+                await pipe.execute()
+            pending.clear()
+
+        async def keep_lease() -> None:
+            # checkpoints alone do not come while every worker waits out a
+            # flood wait, which can be longer than the lease
+            while True:
+                await asyncio.sleep(self.lease / 3)
+                await self.redis.expire(
+                    self.__key(job_id, f'lease_{start}'), self.lease
+                )
+
+        async def on_result(tid: int, ok: bool) -> None:
+            pending[tid] = SENT if ok else FAILED
+            if len(pending) >= self.checkpoint:
+                await flush()
+
+        keeper = asyncio.create_task(keep_lease())
+        try:
+            stats = await broadcaster.run(messages, on_result=on_result)
+        finally:
+            keeper.cancel()
+        await flush()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.sadd(self.__key(job_id, 'done'), start)
+            pipe.delete(self.__key(job_id, f'lease_{start}'))
+            await pipe.execute()
+        return stats
+
+    async def _finish(self, job_id: str, total: int) -> bool:
+        batches = (total + self.batch_size - 1) // self.batch_size
+        done = await self.redis.scard(self.__key(job_id, 'done'))
+        if done < batches:
+            return False
+
+        removed = await self.redis.srem(self.__jobs_key, job_id)
+        if removed:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for name in (
+                    'meta',
+                    'texts',
+                    'recipients',
+                    'state',
+                    'cursor',
+                    'batches',
+                    'done',
+                ):
+                    pipe.expire(self.__key(job_id, name), self.keep)
+                await pipe.execute()
+            logger.info('Broadcast job %s finished', job_id)
+        return True
+
+    async def drain(
+        self, job_id: str, broadcaster: Broadcaster
+    ) -> BroadcastStats:
+        '''Sends the job's remaining messages and returns its progress.
+
+        Returns at once if the job is already drained by this process.
+        '''
+        if job_id in self.running:
+            return await self.progress(job_id)
+        self.running.add(job_id)
+        try:
+            total = await self.total(job_id)
+            raw_texts = await self.redis.hgetall(self.__key(job_id, 'texts'))
+            texts = {
+                key: text.decode('utf-8') for key, text in raw_texts.items()
+            }
+
+            while (start := await self._claim(job_id, total)) is not None:
+                await self._run_batch(job_id, start, broadcaster, texts)
+
+            await self._finish(job_id, total)
+        finally:
+            self.running.discard(job_id)
+        return await self.progress(job_id)
+
+    async def drain_all(self, broadcaster: Broadcaster) -> None:
+        '''Drains every unfinished job not already drained by this process.'''
+        for job_id in await self.active_jobs():
+            if job_id in self.running:
+                continue
+            stats = await self.drain(job_id, broadcaster)
+            logger.info('Broadcast job %s: %s', job_id, stats)
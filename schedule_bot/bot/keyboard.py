@@ -1,7 +1,7 @@
 from aiogram import types
 from aiogram.utils.emoji import emojize
 
-from schedule_bot.manager import manager
+from schedule_bot.manager import async_manager
 
 
 class Keyboard:
@@ -92,10 +92,14 @@ class Keyboard:
         )
 
     @staticmethod
-    def build_settings_keyboard(user_id: int) -> types.InlineKeyboardMarkup:
+    async def build_settings_keyboard(
+        user_id: int,
+    ) -> types.InlineKeyboardMarkup:
         keyboard = types.InlineKeyboardMarkup(row_width=1)
         fields = ('Утренние сообщения',)
-        settings = manager.get_user_settings_by_telegram_id(user_id)
+        settings = await async_manager.get_user_settings_by_telegram_id(
+            user_id
+        )
         if not settings:
             return None
 
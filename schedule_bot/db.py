@@ -1,9 +1,21 @@
 from __future__ import annotations
 
+import datetime
 from typing import Any, List, Optional, Union
 
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, BigInteger
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    select,
+)
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql.expression import ScalarSelect
 
 from schedule_bot import Base, engine, logger
 from schedule_bot.utils.times import Times
@@ -37,7 +49,7 @@ class Author(Base):
     __tablename__ = 'authors'
 
     id: int = Column(Integer, primary_key=True)
-    name: str = Column(String(100))
+    name: str = Column(String(100), index=True, unique=True)
     department: str = Column(String(5))
 
     schedules: List[Schedule] = relationship(
@@ -64,7 +76,7 @@ class Lesson(Base):
     __tablename__ = 'lessons'
 
     id: int = Column(Integer, primary_key=True)
-    name: str = Column(String(150))
+    name: str = Column(String(150), index=True, unique=True)
 
     schedules: List[Schedule] = relationship(
         'Schedule', back_populates='lesson'
@@ -86,7 +98,7 @@ class LessonType(Base):
     __tablename__ = 'lesson_types'
 
     id: int = Column(Integer, primary_key=True)
-    type: str = Column(String(30))
+    type: str = Column(String(30), index=True, unique=True)
 
     def __init__(self, type: str) -> None:
         self.type = type
@@ -100,8 +112,49 @@ class LessonType(Base):
         return False
 
 
+class ScheduleVersion(Base):
+    '''Imported generation of the schedule; readers see only the active one.'''
+
+    __tablename__ = 'schedule_versions'
+
+    id: int = Column(Integer, primary_key=True)
+    created: datetime.datetime = Column(
+        DateTime, default=datetime.datetime.now
+    )
+    active: bool = Column(Boolean, default=False, nullable=False)
+    # bumped by in-place (diff) imports so readers notice the change
+    revision: int = Column(Integer, default=0, nullable=False)
+
+    def __init__(self, active: bool = False) -> None:
+        self.active = active
+        self.revision = 0
+
+    def __repr__(self) -> str:
+        active = ' (active)' if self.active else ''
+        return f'<ScheduleVersion {self.id}{active}>'
+
+    @staticmethod
+    def active_id() -> ScalarSelect:
+        return (
+            select(ScheduleVersion.id)
+            .where(ScheduleVersion.active.is_(True))  # type: ignore
+            .scalar_subquery()
+        )
+
+
 class Schedule(Base):
     __tablename__ = 'schedule'
+    __table_args__ = (
+        Index(
+            'ix_schedule_slot',
+            'generation',
+            'group_id',
+            'weekday',
+            'overline',
+            'num',
+            unique=True,
+        ),
+    )
 
     id: int = Column(Integer, primary_key=True)
     overline: bool = Column(Boolean)
@@ -115,6 +168,9 @@ class Schedule(Base):
     lesson_type_id: int = Column(
         Integer, ForeignKey('lesson_types.id'), nullable=True
     )
+    generation: Optional[int] = Column(
+        Integer, ForeignKey('schedule_versions.id'), nullable=True
+    )
 
     group: Group = relationship(
         'Group', back_populates='schedules', lazy='joined'
@@ -140,8 +196,10 @@ class Schedule(Base):
         overline: bool,
         classroom: str,
         corps: Optional[str] = None,
+        generation: Optional[int] = None,
     ) -> None:
         self.classroom = classroom
+        self.generation = generation
         if isinstance(group, Group):
             self.group = group
         else:
@@ -3,6 +3,7 @@ from typing import Any, Callable
 
 from sqlalchemy.exc import SQLAlchemyError
 
+from schedule_bot import AsyncSession as AsyncSessionCreator
 from schedule_bot import Session as SessionCreator
 from schedule_bot import logger
 
@@ -19,6 +20,26 @@ def orm_function(func: Callable[..., Any]):  # type: ignore
                         'SQL Manager error (%s): %s', func.__name__, error
                     )
                     session.rollback()
+                    return None
         return func(*args, **kwargs)
 
     return wrapper
+
+
+def async_orm_function(func: Callable[..., Any]):  # type: ignore
+    @wraps(func)
+    async def wrapper(*args, **kwargs):  # type: ignore
+        if kwargs.get('session') is None:
+            kwargs.pop('session', None)
+            async with AsyncSessionCreator() as session:
+                try:
+                    return await func(*args, session=session, **kwargs)
+                except SQLAlchemyError as error:
+                    logger.warning(
+                        'SQL Manager error (%s): %s', func.__name__, error
+                    )
+                    await session.rollback()
+                    return None
+        return await func(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,207 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from schedule_bot import db, logger
+from schedule_bot.manager import async_orm_function
+from schedule_bot.manager.cache import UserProfile, user_cache
+
+
+@async_orm_function
+async def get_groups(session: AsyncSession = None) -> List[db.Group]:
+    result = await session.execute(select(db.Group))
+    return result.scalars().all()
+
+
+@async_orm_function
+async def get_full_schedule(session: AsyncSession = None) -> List[db.Schedule]:
+    result = await session.execute(
+        select(db.Schedule)
+        .where(db.Schedule.generation == db.ScheduleVersion.active_id())
+        .order_by(
+            db.Schedule.group_id,
+            db.Schedule.weekday,
+            db.Schedule.overline,
+            db.Schedule.num,
+        )
+    )
+    return result.scalars().all()
+
+
+@async_orm_function
+async def get_active_version(session: AsyncSession = None) -> Optional[int]:
+    result = await session.execute(select(db.ScheduleVersion.active_id()))
+    return result.scalar()
+
+
+@async_orm_function
+async def get_active_revision(
+    session: AsyncSession = None,
+) -> Optional[Tuple[int, int]]:
+    result = await session.execute(
+        select(db.ScheduleVersion.id, db.ScheduleVersion.revision).where(
+            db.ScheduleVersion.active.is_(True)
+        )
+    )
+    row = result.first()
+    return (row.id, row.revision) if row is not None else None
+
+
+@async_orm_function
+async def get_all_users(session: AsyncSession = None) -> List[db.ActiveUser]:
+    result = await session.execute(select(db.ActiveUser))
+    return result.scalars().all()
+
+
+@async_orm_function
+async def get_users_in_groups(
+    groups: List[str], session: AsyncSession = None
+) -> List[db.ActiveUser]:
+    result = await session.execute(
+        select(db.ActiveUser)
+        .join(db.Group, db.Group.id == db.ActiveUser.group_id)
+        .where(db.Group.group.in_(groups))  # type: ignore
+    )
+    return result.scalars().all()
+
+
+@async_orm_function
+async def group_exists(name: str, session: AsyncSession = None) -> bool:
+    result = await session.execute(
+        select(db.Group.group).where(db.Group.group == name)
+    )
+    return result.first() is not None
+
+
+@async_orm_function
+async def get_user(
+    tid: int, session: AsyncSession = None
+) -> Optional[db.ActiveUser]:
+    result = await session.execute(
+        select(db.ActiveUser).where(db.ActiveUser.tid == tid)
+    )
+    return result.scalars().first()
+
+
+async def get_user_profile(
+    tid: int, session: AsyncSession = None
+) -> Optional[UserProfile]:
+    profile = await user_cache.get(tid)
+    if profile is None:
+        generation = await user_cache.generation(tid)
+        user = await get_user(tid, session=session)
+        if user is None:
+            return None
+        profile = UserProfile(
+            user.tid,
+            user.group_id,
+            user.group.group if user.group is not None else None,
+            bool(user.vip),
+        )
+        await user_cache.fill(profile, generation)
+    return profile
+
+
+@async_orm_function
+async def set_user_group(
+    uid: int, group: str, commit: bool = True, session: AsyncSession = None
+) -> None:
+    result = await session.execute(
+        select(db.Group).where(db.Group.group == group)
+    )
+    group_obj: db.Group = result.scalars().first()
+    await session.execute(
+        update(db.ActiveUser)
+        .where(db.ActiveUser.tid == uid)
+        .values(group_id=group_obj.id)
+    )
+    logger.info(
+        'User %s update group to %s (%d)', uid, group_obj.group, group_obj.id
+    )
+    if commit:
+        await session.commit()
+        await user_cache.update(
+            uid, group_id=group_obj.id, group=group_obj.group
+        )
+    else:
+        await user_cache.invalidate(uid)
+
+
+@async_orm_function
+async def drop_user_group(
+    uid: int, commit: bool = True, session: AsyncSession = None
+) -> None:
+    await session.execute(
+        update(db.ActiveUser)
+        .where(db.ActiveUser.tid == uid)
+        .values(group_id=None)
+    )
+    logger.info('User %s drop out group', uid)
+    if commit:
+        await session.commit()
+        await user_cache.update(uid, group_id=None, group=None)
+    else:
+        await user_cache.invalidate(uid)
+
+
+@async_orm_function
+async def add_user(
+    uid: int, commit: bool = True, session: AsyncSession = None
+) -> None:
+    user = db.ActiveUser(uid)
+    session.add(user)
+    logger.info('New user added: %s', user.tid)
+    if commit:
+        await session.commit()
+        await user_cache.set(UserProfile(uid, None, None, False))
+    else:
+        await user_cache.invalidate(uid)
+
+
+@async_orm_function
+async def get_all_vip_users(
+    session: AsyncSession = None,
+) -> List[db.ActiveUser]:
+    result = await session.execute(
+        select(db.ActiveUser).where(db.ActiveUser.vip.is_(True))  # type: ignore
+    )
+    return result.scalars().all()
+
+
+@async_orm_function
+async def get_vip_users_by_group(
+    session: AsyncSession = None,
+) -> Dict[str, List[int]]:
+    result = await session.execute(
+        select(db.Group.group, db.ActiveUser.tid)
+        .join(db.Group, db.Group.id == db.ActiveUser.group_id)
+        .where(db.ActiveUser.vip.is_(True))  # type: ignore
+        .order_by(db.ActiveUser.group_id)
+    )
+    groups: Dict[str, List[int]] = {}
+    for group, tid in result:
+        groups.setdefault(group, []).append(tid)
+    return groups
+
+
+@async_orm_function
+async def set_vip_status_by_telegram_id(
+    tid: int, value: bool, session: AsyncSession = None
+) -> None:
+    await session.execute(
+        update(db.ActiveUser)
+        .where(db.ActiveUser.tid == tid)
+        .values(vip=value)
+    )
+    await session.commit()
+    await user_cache.update(tid, vip=value)
+
+
+async def get_user_settings_by_telegram_id(
+    tid: int, session: AsyncSession = None
+) -> Optional[Dict[str, Any]]:
+    profile = await get_user_profile(tid, session=session)
+    if profile:
+        return {'vip': profile.vip}
+    return None
@@ -0,0 +1,161 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any, NamedTuple, Optional, Tuple
+
+from schedule_bot import (
+    REDIS_HOST,
+    REDIS_PORT,
+    USER_CACHE_REDIS,
+    USER_CACHE_SIZE,
+    USER_CACHE_TTL,
+    logger,
+)
+
+
+class UserProfile(NamedTuple):
+    tid: int
+    group_id: Optional[int]
+    group: Optional[str]
+    vip: bool
+
+
+class UserCache:
+    '''Cache of user profiles with a per-entry TTL.
+
+    Without Redis the profiles live in a bounded LRU in process memory.
+    With a Redis client they are kept only in Redis, so several bot
+    processes see the same writes and never answer from a stale local copy.
+
+    Profiles read from the database are stored with `fill`, which skips
+    the store when the profile was written or invalidated after the read
+    started, so a slow read never overwrites a fresher profile.
+    '''
+
+    prefix = 'user_'
+    generation_prefix = 'user_generation_'
+
+    def __init__(
+        self, maxsize: int = 10000, ttl: float = 600, redis: Any = None
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.redis = redis
+        self._data: 'OrderedDict[int, Tuple[float, UserProfile]]' = (
+            OrderedDict()
+        )
+        # writes to the local cache, see `generation`
+        self._writes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __keyify(self, tid: int) -> str:
+        return f'{self.prefix}{tid}'
+
+    def __generation_key(self, tid: int) -> str:
+        return f'{self.generation_prefix}{tid}'
+
+    def _get_local(self, tid: int) -> Optional[UserProfile]:
+        entry = self._data.get(tid)
+        if entry is None:
+            return None
+        expires, profile = entry
+        if expires < time.monotonic():
+            del self._data[tid]
+            return None
+        self._data.move_to_end(tid)
+        return profile
+
+    def _set_local(self, profile: UserProfile) -> None:
+        self._data[profile.tid] = (time.monotonic() + self.ttl, profile)
+        self._data.move_to_end(profile.tid)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def _bump(self, tid: int) -> None:
+        # before the write itself: a concurrent `fill` either sees the new
+        # generation or stores its profile before the write replaces it
+        key = self.__generation_key(tid)
+        await self.redis.incr(key)
+        await self.redis.expire(key, int(self.ttl))
+
+    async def get(self, tid: int) -> Optional[UserProfile]:
+        if self.redis is None:
+            return self._get_local(tid)
+        value: Optional[bytes] = await self.redis.get(self.__keyify(tid))
+        if value is None:
+            return None
+        return UserProfile(*json.loads(value))
+
+    async def generation(self, tid: int) -> Any:
+        '''Token to pass to `fill` before reading a profile from the DB.'''
+        if self.redis is None:
+            return self._writes
+        return await self.redis.get(self.__generation_key(tid))
+
+    async def fill(self, profile: UserProfile, generation: Any) -> None:
+        '''Stores a DB profile unless it was written since `generation`.'''
+        if self.redis is None:
+            if self._writes == generation:
+                self._set_local(profile)
+            return
+        key = self.__keyify(profile.tid)
+        stored = await self.redis.set(
+            key, json.dumps(profile), ex=int(self.ttl), nx=True
+        )
+        if stored and generation != await self.redis.get(
+            self.__generation_key(profile.tid)
+        ):
+            # written meanwhile: the stored profile may be stale
+            await self.redis.delete(key)
+
+    async def set(self, profile: UserProfile) -> None:
+        if self.redis is None:
+            self._writes += 1
+            self._set_local(profile)
+            return
+        await self._bump(profile.tid)
+        await self.redis.set(
+            self.__keyify(profile.tid),
+            json.dumps(profile),
+            ex=int(self.ttl),
+        )
+
+    async def update(self, tid: int, **fields: Any) -> None:
+        '''Write changed fields through to a cached profile.
+
+        Nothing is cached for unknown users: the next `get` misses and the
+        profile is loaded from the database.
+        '''
+        profile = await self.get(tid)
+        if profile is not None:
+            await self.set(profile._replace(**fields))
+        else:
+            await self.invalidate(tid)
+
+    async def invalidate(self, tid: int) -> None:
+        if self.redis is None:
+            self._writes += 1
+            self._data.pop(tid, None)
+            return
+        await self._bump(tid)
+        await self.redis.delete(self.__keyify(tid))
+
+
+def create_user_cache() -> UserCache:
+    redis = None
+    if USER_CACHE_REDIS:
+        from aioredis import Redis
+
+        redis = Redis(host=REDIS_HOST, port=REDIS_PORT)
+    logger.info(
+        'User cache: size %d, ttl %ds, redis %s',
+        USER_CACHE_SIZE,
+        USER_CACHE_TTL,
+        'on' if redis is not None else 'off',
+    )
+    return UserCache(USER_CACHE_SIZE, USER_CACHE_TTL, redis)
+
+
+user_cache = create_user_cache()
@@ -36,6 +36,7 @@ def get_schedule(
         .filter(
             (db.Schedule.group == group)
             & (db.Schedule.weekday == weekday)
+            & (db.Schedule.generation == db.ScheduleVersion.active_id())
             & (db.Schedule.overline == overline)
         )
         .join(db.Lesson, db.Lesson.id == db.Schedule.lesson_id)
@@ -49,6 +50,46 @@ def get_schedule(
     return data
 
 
+@orm_function
+def get_full_schedule(session: Session = None) -> List[db.Schedule]:
+    return (
+        session.query(db.Schedule)
+        .filter(db.Schedule.generation == db.ScheduleVersion.active_id())
+        .order_by(
+            db.Schedule.group_id,
+            db.Schedule.weekday,
+            db.Schedule.overline,
+            db.Schedule.num,
+        )
+        .all()
+    )
+
+
+@orm_function
+def get_active_version(session: Session = None) -> Optional[int]:
+    return session.query(db.ScheduleVersion.active_id()).scalar()
+
+
+@orm_function
+def get_active_revision(session: Session = None) -> Optional[Tuple[int, int]]:
+    row = (
+        session.query(db.ScheduleVersion.id, db.ScheduleVersion.revision)
+        .filter(db.ScheduleVersion.active.is_(True))
+        .first()
+    )
+    return (row.id, row.revision) if row is not None else None
+
+
+def _bump_revision(version: Optional[int], session: Session) -> None:
+    '''Marks an edit of the version, so the bot reloads its snapshot.'''
+    session.query(db.ScheduleVersion).filter(
+        db.ScheduleVersion.id == version
+    ).update(
+        {db.ScheduleVersion.revision: db.ScheduleVersion.revision + 1},
+        synchronize_session=False,
+    )
+
+
 @orm_function
 def get_lesson_by_num(
     group: Union[str, db.Group],
@@ -64,6 +105,7 @@ def get_lesson_by_num(
         .filter(
             (db.Schedule.group == group)
             & (db.Schedule.weekday == weekday)
+            & (db.Schedule.generation == db.ScheduleVersion.active_id())
             & (db.Schedule.overline == overline)
             & (db.Schedule.num == num)
         )
@@ -86,9 +128,11 @@ def get_lesson_with_next(
         .filter(
             (db.Schedule.group == group)
             & (db.Schedule.weekday == weekday)
+            & (db.Schedule.generation == db.ScheduleVersion.active_id())
             & (db.Schedule.overline == overline)
             & (db.Schedule.num > num)
         )
+        .order_by(db.Schedule.num)
         .first()
     )
     return lesson, next_lesson
@@ -110,6 +154,7 @@ def get_author_schedule(
         .filter(
             (db.Schedule.author == author)
             & (db.Schedule.weekday == weekday)
+            & (db.Schedule.generation == db.ScheduleVersion.active_id())
             & (db.Schedule.overline == is_overline)
         )
         .order_by(db.Schedule.num)
@@ -221,6 +266,7 @@ def add_schedule(
     commit: bool = True,
     session: Session = None,
 ) -> int:
+    version = get_active_version(session=session)
     schedule = db.Schedule(
         group,
         lesson,
@@ -231,8 +277,10 @@ def add_schedule(
         is_overline,
         classroom,
         corps,
+        version,
     )
     session.add(schedule)
+    _bump_revision(version, session)
     if commit:
         session.commit()
     return schedule.id
@@ -252,10 +300,12 @@ def add_or_upd_schedule(
     commit: bool = True,
     session: Session = None,
 ) -> int:
+    version = get_active_version(session=session)
     schedule = (
         session.query(db.Schedule).filter(
             (db.Schedule.group_id == group)
             & (db.Schedule.weekday == weekday)
+            & (db.Schedule.generation == version)
             & (db.Schedule.overline == is_overline)
             & (db.Schedule.num == num)
         )
@@ -271,6 +321,7 @@ def add_or_upd_schedule(
             is_overline,
             classroom,
             corps,
+            version,
         )
         session.add(schedule)
     else:
@@ -279,6 +330,7 @@ def add_or_upd_schedule(
         schedule.lesson_type_id = lesson_type
         schedule.classroom = classroom
         schedule.corps = corps
+    _bump_revision(version, session)
 
     if commit:
         session.commit()
@@ -294,12 +346,15 @@ def delete_schedule(
     commit: bool = True,
     session: Session = None,
 ) -> None:
+    version = get_active_version(session=session)
     session.query(db.Schedule).filter(
         (db.Schedule.group_id == group)
         & (db.Schedule.weekday == weekday)
+        & (db.Schedule.generation == version)
         & (db.Schedule.overline == is_overline)
         & (db.Schedule.num == num)
     ).delete(synchronize_session=False)
+    _bump_revision(version, session)
     if commit:
         session.commit()
 
@@ -0,0 +1,83 @@
+'''add schedule indexes and unique keys
+
+Revision ID: 3b1f6c2d9a47
+Revises: dae6df72a35e
+Create Date: 2022-10-03 18:41:12.514203
+
+'''
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '3b1f6c2d9a47'
+down_revision = 'dae6df72a35e'
+branch_labels = None
+depends_on = None
+
+# (table, name column, schedule foreign key)
+DIMENSIONS = [
+    ('lessons', 'name', 'lesson_id'),
+    ('authors', 'name', 'author_id'),
+    ('lesson_types', 'type', 'lesson_type_id'),
+]
+
+
+def deduplicate_dimension(table: str, column: str, foreign_key: str) -> None:
+    # point schedule rows at the first row with the same name
+    op.execute(
+        sa.text(
+            f'''
+            UPDATE schedule SET {foreign_key} = (
+                SELECT MIN(d2.id) FROM {table} d2 WHERE d2.{column} = (
+                    SELECT d1.{column} FROM {table} d1
+                    WHERE d1.id = schedule.{foreign_key}
+                )
+            )
+            WHERE {foreign_key} IN (
+                SELECT id FROM {table} WHERE {column} IS NOT NULL
+                AND id NOT IN (
+                    SELECT MIN(id) FROM {table} GROUP BY {column}
+                )
+            )
+            '''
+        )
+    )
+    op.execute(
+        sa.text(
+            f'''
+            DELETE FROM {table} WHERE {column} IS NOT NULL
+            AND id NOT IN (SELECT MIN(id) FROM {table} GROUP BY {column})
+            '''
+        )
+    )
+
+
+def upgrade() -> None:
+    for table, column, foreign_key in DIMENSIONS:
+        deduplicate_dimension(table, column, foreign_key)
+        op.create_index(f'ix_{table}_{column}', table, [column], unique=True)
+
+    # keep the most recently imported row of every lesson slot
+    op.execute(
+        sa.text(
+            '''
+            DELETE FROM schedule WHERE id NOT IN (
+                SELECT MAX(id) FROM schedule
+                GROUP BY group_id, weekday, overline, num
+            )
+            '''
+        )
+    )
+    op.create_index(
+        'ix_schedule_slot',
+        'schedule',
+        ['group_id', 'weekday', 'overline', 'num'],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    # WARNING: removed duplicates are not restored
+    op.drop_index('ix_schedule_slot', 'schedule')
+    for table, column, _ in DIMENSIONS:
+        op.drop_index(f'ix_{table}_{column}', table)
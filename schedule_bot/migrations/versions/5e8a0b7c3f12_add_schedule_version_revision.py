@@ -0,0 +1,29 @@
+'''add schedule version revision
+
+Revision ID: 5e8a0b7c3f12
+Revises: 7c4e2a91d5b3
+Create Date: 2022-10-09 13:05:48.216730
+
+'''
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '5e8a0b7c3f12'
+down_revision = '7c4e2a91d5b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'schedule_versions',
+        sa.Column(
+            'revision', sa.Integer(), nullable=False, server_default='0'
+        ),
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('schedule_versions') as batch_op:
+        batch_op.drop_column('revision')
@@ -0,0 +1,73 @@
+'''add schedule versions
+
+Revision ID: 7c4e2a91d5b3
+Revises: 3b1f6c2d9a47
+Create Date: 2022-10-06 20:12:37.904118
+
+'''
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '7c4e2a91d5b3'
+down_revision = '3b1f6c2d9a47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'schedule_versions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('created', sa.DateTime(), nullable=True),
+        sa.Column('active', sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    with op.batch_alter_table('schedule') as batch_op:
+        batch_op.add_column(
+            sa.Column('generation', sa.Integer(), nullable=True)
+        )
+        batch_op.create_foreign_key(
+            'fk_schedule_generation',
+            'schedule_versions',
+            ['generation'],
+            ['id'],
+        )
+
+    # the rows already in the table become the first active version
+    op.execute(
+        sa.text(
+            'INSERT INTO schedule_versions (id, created, active) '
+            'VALUES (1, CURRENT_TIMESTAMP, TRUE)'
+        )
+    )
+    op.execute(sa.text('UPDATE schedule SET generation = 1'))
+
+    op.drop_index('ix_schedule_slot', 'schedule')
+    op.create_index(
+        'ix_schedule_slot',
+        'schedule',
+        ['generation', 'group_id', 'weekday', 'overline', 'num'],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    # WARNING: rows of inactive versions are removed
+    op.execute(
+        sa.text(
+            'DELETE FROM schedule WHERE generation IS NULL OR generation '
+            'NOT IN (SELECT id FROM schedule_versions WHERE active)'
+        )
+    )
+    op.drop_index('ix_schedule_slot', 'schedule')
+    op.create_index(
+        'ix_schedule_slot',
+        'schedule',
+        ['group_id', 'weekday', 'overline', 'num'],
+        unique=True,
+    )
+    with op.batch_alter_table('schedule') as batch_op:
+        batch_op.drop_constraint('fk_schedule_generation', type_='foreignkey')
+        batch_op.drop_column('generation')
+    op.drop_table('schedule_versions')
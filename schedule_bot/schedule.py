@@ -1,16 +1,17 @@
+import bisect
 import datetime
-from typing import List, Optional, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 from schedule_bot import db
-from schedule_bot.manager import manager
+from schedule_bot.snapshot import CachedLesson, ScheduleSnapshot
 from schedule_bot.utils.times import Times
 
 
 class NowAndNext:
     def __init__(
         self,
-        now_lesson: db.Schedule,
-        next_lesson: db.Schedule,
+        now_lesson: Optional[CachedLesson],
+        next_lesson: Optional[CachedLesson],
         time_remain: datetime.time,
         time_until: datetime.time,
     ):
@@ -55,7 +56,10 @@ class NowAndNext:
 
 
 class Schedule:
-    def __init__(self) -> None:
+    def __init__(self, snapshot: Optional[ScheduleSnapshot] = None) -> None:
+        self.snapshot = snapshot if snapshot is not None else ScheduleSnapshot()
+        self._responses: Dict[Tuple[str, int, bool], str] = {}
+        self._responses_version = self.snapshot.version
         self._time_schedule = ""
         for lesson_num, (begin, end) in enumerate(
             zip(Times.lesson_begins, Times.lesson_ends), start=1
@@ -73,34 +77,27 @@ class Schedule:
             ).isocalendar()[1:]
         return week, weekday
 
-    def now(self, group: db.Group) -> NowAndNext:
+    def now(self, group: Union[str, db.Group]) -> NowAndNext:
         week, weekday = datetime.datetime.now().isocalendar()[1:]
         now_time = datetime.datetime.now().time()
-        cur_lesson = len(Times.lesson_begins)  # out of range
-
-        for lesson_num, (_, end_time) in enumerate(
-            zip(Times.lesson_begins, Times.lesson_ends)
-        ):
-            if now_time <= end_time:
-                cur_lesson = lesson_num + 1
-                break
-
-        now_lesson, next_lesson = manager.get_lesson_with_next(
-            group, weekday - 1, self.is_overline(week), cur_lesson
-        )
-
-        time_begin = Times.lesson_begins[cur_lesson - 1]
-        time_end = Times.lesson_ends[cur_lesson - 1]
-
-        if (
-            not time_begin <= now_time <= time_end
-            and now_lesson is not None
-        ):
-            now_lesson, next_lesson = None, now_lesson
+        lessons = self.snapshot.day(group, weekday - 1, self.is_overline(week))
+
+        cur_lesson = Times.lesson_slot(now_time)
+        pos = bisect.bisect_left(lessons.nums, cur_lesson)
+        now_lesson: Optional[CachedLesson] = None
+        next_lesson: Optional[CachedLesson] = None
+        if pos < len(lessons):
+            if lessons[pos].num == cur_lesson and Times.is_lesson_time(
+                cur_lesson, now_time
+            ):
+                now_lesson = lessons[pos]
+                pos += 1
+            if pos < len(lessons):
+                next_lesson = lessons[pos]
 
         if now_lesson is not None:
             time_remain = time_delta(
-                now_time, time_end
+                now_time, Times.lesson_ends[now_lesson.num - 1]
             )
         else:
             time_remain = datetime.time(0, 0, 0)
@@ -112,43 +109,45 @@ class Schedule:
         else:
             time_until = datetime.time(0, 0, 0)
 
-        now_next = NowAndNext(now_lesson, next_lesson, time_remain, time_until)
-
-        return now_next
+        return NowAndNext(now_lesson, next_lesson, time_remain, time_until)
 
     def today(self, group: Union[str, db.Group]) -> List[str]:
         week, weekday = datetime.datetime.now().isocalendar()[1:]
-        schedule = manager.get_schedule(
-            group, weekday - 1, self.is_overline(week)
-        )
-        str_schedule = []
-        for sch in schedule:
-            str_schedule.append(str(sch[0]))
-
-        return str_schedule
+        return self.day_schedule(group, weekday - 1, self.is_overline(week))
 
     def tomorrow(self, group: Union[str, db.Group]) -> List[str]:
         week, weekday = (
             datetime.datetime.now() + datetime.timedelta(days=1)
         ).isocalendar()[1:]
-        schedule = manager.get_schedule(
-            group, weekday - 1, self.is_overline(week)
-        )
-        str_schedule = []
-        for sch in schedule:
-            str_schedule.append(str(sch[0]))
-
-        return str_schedule
+        return self.day_schedule(group, weekday - 1, self.is_overline(week))
 
     def day_schedule(
         self, group: Union[str, db.Group], day: int, is_overline: bool
     ) -> List[str]:
-        schedule = manager.get_schedule(group, day, is_overline)
-        str_schedule = []
-        for sch in schedule:
-            str_schedule.append(str(sch[0]))
+        return [
+            str(lesson)
+            for lesson in self.snapshot.day(group, day, is_overline)
+        ]
 
-        return str_schedule
+    def day_message(
+        self, group: Union[str, db.Group], day: int, is_overline: bool
+    ) -> str:
+        '''Rendered reply for a day button, cached until the snapshot reloads.'''
+        if self._responses_version != self.snapshot.version:
+            self._responses = {}
+            self._responses_version = self.snapshot.version
+
+        key = (str(group), day, is_overline)
+        message = self._responses.get(key)
+        if message is None:
+            sch = self.day_schedule(group, day, is_overline)
+            message = f'{Times.weekdays[day]}. {"Над" if is_overline else "Под"} чертой.\n\n'
+            if len(sch) == 0:
+                message += 'В этот день у вас нет пар'
+            else:
+                message += '\n\n'.join(sch)
+            self._responses[key] = message
+        return message
 
     def time_schedule(self) -> str:
         return self._time_schedule
@@ -0,0 +1,113 @@
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from schedule_bot import db, logger
+from schedule_bot.manager import async_manager, manager, orm_function
+
+SnapshotKey = Tuple[str, int, bool]  # (group, weekday, overline)
+
+
+class CachedLesson:
+    '''Pre-rendered schedule row detached from the database session.'''
+
+    __slots__ = ('num', 'text', 'name')
+
+    def __init__(self, lesson: db.Schedule) -> None:
+        self.num: int = lesson.num
+        self.text: str = str(lesson)
+        self.name: str = lesson.just_name()
+
+    def __repr__(self) -> str:
+        return f'<CachedLesson {self.num} {self.name}>'
+
+    def __str__(self) -> str:
+        return self.text
+
+    def just_name(self) -> str:
+        return self.name
+
+
+class CachedDay(List[CachedLesson]):
+    '''Lessons of a day with their numbers kept for bisecting.'''
+
+    def __init__(self, lessons: Iterable[CachedLesson] = ()) -> None:
+        super().__init__(lessons)
+        self.nums: List[int] = [lesson.num for lesson in self]
+
+
+EMPTY_DAY = CachedDay()
+
+
+class ScheduleSnapshot:
+    '''In-memory copy of the whole timetable.
+
+    The timetable changes only when the updater runs, so all groups are
+    loaded at once and served from memory until `reload` is called.
+    `refresh` reloads only when the updater has published or changed the
+    active schedule version, which costs a single small query otherwise.
+    The bot loads the snapshot with `async_reload` on startup; reading a
+    day before the first load is an error rather than a blocking query.
+    '''
+
+    def __init__(self) -> None:
+        self._days: Dict[SnapshotKey, CachedDay] = {}
+        self.version = 0
+        self.revision: Optional[Tuple[int, int]] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.version > 0
+
+    @orm_function
+    def reload(self, session: Session = None) -> None:
+        # read the version first: a publish in between only causes one
+        # extra reload on the next refresh
+        revision = manager.get_active_revision(session=session)
+        self._load(manager.get_full_schedule(session=session), revision)
+
+    async def async_reload(self, session: AsyncSession = None) -> None:
+        revision = await async_manager.get_active_revision(session=session)
+        rows = await async_manager.get_full_schedule(session=session)
+        self._load(rows, revision)
+
+    @orm_function
+    def refresh(self, session: Session = None) -> bool:
+        if manager.get_active_revision(session=session) == self.revision:
+            return False
+        self.reload(session=session)
+        return True
+
+    async def async_refresh(self, session: AsyncSession = None) -> bool:
+        active = await async_manager.get_active_revision(session=session)
+        if active == self.revision:
+            return False
+        await self.async_reload(session=session)
+        return True
+
+    def _load(
+        self, rows: List[db.Schedule], revision: Optional[Tuple[int, int]]
+    ) -> None:
+        days: Dict[SnapshotKey, List[CachedLesson]] = {}
+        for lesson in rows:
+            key = (lesson.group.group, lesson.weekday, bool(lesson.overline))
+            days.setdefault(key, []).append(CachedLesson(lesson))
+
+        self._days = {key: CachedDay(lessons) for key, lessons in days.items()}
+        self.revision = revision
+        self.version += 1
+        logger.info(
+            'Schedule snapshot v%d loaded from revision %s: %d rows, %d days',
+            self.version,
+            revision,
+            len(rows),
+            len(days),
+        )
+
+    def day(
+        self, group: Union[str, db.Group], weekday: int, overline: bool
+    ) -> CachedDay:
+        if not self.loaded:
+            raise RuntimeError('schedule snapshot is not loaded')
+        return self._days.get((str(group), weekday, bool(overline)), EMPTY_DAY)
@@ -1,9 +1,13 @@
 import logging
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
 
+from sqlalchemy import distinct, func, insert, literal, select
 from sqlalchemy.orm import Session
 
 from schedule_bot import db
-from schedule_bot.manager import manager, orm_function
+from schedule_bot.manager import orm_function
 
 __log_format = r'[%(levelname)s] %(message)s'
 
@@ -14,108 +18,357 @@ handler.setFormatter(logging.Formatter(__log_format))
 logger.addHandler(handler)
 
 
+def lesson_slot(index: int) -> Tuple[int, int, bool]:
+    '''(weekday, number, is_overline) of a cell in a group's lesson column.'''
+    return index // 14, index % 14 // 2 + 1, index % 2 == 0
+
+
+# schedule columns compared by the diff import
+DIFF_FIELDS = ('lesson_id', 'author_id', 'lesson_type_id', 'classroom')
+
+SlotKey = Tuple[int, int, bool, int]  # (group_id, weekday, overline, num)
+
+
+class GroupChanges(NamedTuple):
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+
+    def __str__(self) -> str:
+        return f'+{self.inserted} ~{self.updated} -{self.deleted}'
+
+
+def slot_key(row: Dict[str, Any]) -> SlotKey:
+    return row['group_id'], row['weekday'], row['overline'], row['num']
+
+
+def name_map(session: Session, column: Any) -> Dict[str, int]:
+    entity = column.class_
+    return {
+        name: row_id for row_id, name in session.query(entity.id, column).all()
+    }
+
+
 class Updater:
     @orm_function
-    def clear_schedule(self, session: Session = None) -> None:
-        session.query(db.Schedule).delete()
+    def add_lessons(self, lessons_set, session: Session = None) -> None:
+        known = name_map(session, db.Lesson.name)
+        session.add_all(
+            [db.Lesson(lesson) for lesson in lessons_set if lesson not in known]
+        )
         session.commit()
 
     @orm_function
-    def add_lessons(self, lessons_set, session: Session = None) -> None:
-        new_lessons = []
-        for lesson in lessons_set:
-            lesson_id = (
-                session.query(db.Lesson.id)
-                .filter(db.Lesson.name == lesson)
-                .first()
+    def add_authors(self, authors_set, session: Session = None) -> None:
+        known = name_map(session, db.Author.name)
+        session.add_all(
+            [db.Author(author) for author in authors_set if author not in known]
+        )
+        session.commit()
+
+    def _insert_missing(
+        self, session: Session, column: Any, names: Iterable[str]
+    ) -> Dict[str, int]:
+        known = name_map(session, column)
+        missing = set(names) - set(known)
+        if missing:
+            session.bulk_insert_mappings(
+                column.class_, [{column.key: name} for name in missing]
+            )
+            known = name_map(session, column)
+        return known
+
+    def _schedule_rows(
+        self,
+        session: Session,
+        groups: Dict[str, List[Optional[Any]]],
+        generation: int,
+    ) -> List[Dict[str, Any]]:
+        '''Schedule rows of the given groups ready for executemany.
+
+        Lesson, author, type and group ids are preloaded into dicts once
+        and missing names are inserted in batches.
+        '''
+        cells = [
+            lesson
+            for schedule in groups.values()
+            for lesson in schedule
+            if lesson is not None
+        ]
+        group_ids = self._insert_missing(session, db.Group.group, groups)
+        lesson_ids = self._insert_missing(
+            session, db.Lesson.name, (lesson.name for lesson in cells)
+        )
+        author_ids = self._insert_missing(
+            session,
+            db.Author.name,
+            (lesson.author for lesson in cells if lesson.author is not None),
+        )
+        type_ids = name_map(session, db.LessonType.type)
+        unknown_types = set()
+
+        rows = []
+        for group, schedule in groups.items():
+            for i, lesson in enumerate(schedule):
+                if lesson is None:
+                    continue
+                weekday, number, is_overline = lesson_slot(i)
+                type_id = type_ids.get(lesson.lesson_type)
+                if lesson.lesson_type is not None and type_id is None:
+                    unknown_types.add(lesson.lesson_type)
+                rows.append(
+                    {
+                        'group_id': group_ids[group],
+                        'lesson_id': lesson_ids[lesson.name],
+                        'author_id': author_ids.get(lesson.author),
+                        'lesson_type_id': type_id,
+                        'num': number,
+                        'weekday': weekday,
+                        'overline': is_overline,
+                        'classroom': lesson.auditory,
+                        'generation': generation,
+                    }
+                )
+
+        for lesson_type in unknown_types:
+            logger.warning('No lesson type in db: %s', lesson_type)
+        return rows
+
+    @orm_function
+    def stage(
+        self,
+        groups: Dict[str, List[Optional[Any]]],
+        replace_all: bool = False,
+        session: Session = None,
+    ) -> int:
+        '''Writes a new inactive schedule version and returns its id.
+
+        Unless `replace_all` is set, the active rows of groups missing from
+        `groups` are copied into the new version.
+        '''
+        version = db.ScheduleVersion()
+        session.add(version)
+        session.flush()
+
+        rows = self._schedule_rows(session, groups, version.id)
+        session.bulk_insert_mappings(db.Schedule, rows)
+
+        if not replace_all:
+            columns = [
+                column
+                for column in db.Schedule.__table__.columns
+                if column.key not in ('id', 'generation')
+            ]
+            loaded = select(db.Group.id).where(
+                db.Group.group.in_(list(groups))
+            )
+            session.execute(
+                insert(db.Schedule.__table__).from_select(
+                    [column.key for column in columns] + ['generation'],
+                    select(*columns, literal(version.id)).where(
+                        (
+                            db.Schedule.generation
+                            == db.ScheduleVersion.active_id()
+                        )
+                        & db.Schedule.group_id.not_in(loaded)
+                    ),
+                )
             )
-            if lesson_id is None:
-                new_lessons.append(db.Lesson(lesson))
 
-        session.add_all(new_lessons)
         session.commit()
+        logger.info('Staged schedule version %d', version.id)
+        return version.id
 
     @orm_function
-    def add_authors(self, authors_set, session: Session = None) -> None:
-        new_authors = []
-        for author in authors_set:
-            author_id = (
-                session.query(db.Author.id)
-                .filter(db.Author.name == author)
-                .first()
+    def validate(
+        self,
+        version: int,
+        min_coverage: float = 0.5,
+        session: Session = None,
+    ) -> None:
+        '''Raises ValueError if the staged version looks broken.'''
+
+        def count_groups(generation: Any) -> int:
+            return (
+                session.query(func.count(distinct(db.Schedule.group_id)))
+                .filter(db.Schedule.generation == generation)
+                .scalar()
+            )
+
+        staged = count_groups(version)
+        active = count_groups(db.ScheduleVersion.active_id())
+        if staged == 0:
+            raise ValueError(f'schedule version {version} is empty')
+        if staged < active * min_coverage:
+            raise ValueError(
+                f'schedule version {version} has {staged} groups, '
+                f'active version has {active}'
             )
-            if author_id is None:
-                # a_id = manager.add_author(a, commit=False)
-                new_authors.append(db.Author(author))
 
-        session.add_all(new_authors)
+    @orm_function
+    def publish(self, version: int, session: Session = None) -> None:
+        '''Makes the version active and removes all the other versions.'''
+        # the pointer moves with a single UPDATE: readers see either the
+        # old or the new version, never a partially loaded one
+        session.query(db.ScheduleVersion).update(
+            {db.ScheduleVersion.active: db.ScheduleVersion.id == version},
+            synchronize_session=False,
+        )
+        session.commit()
+        self.discard(version, keep=True, session=session)
+        logger.info('Published schedule version %d', version)
+
+    @orm_function
+    def discard(
+        self, version: int, keep: bool = False, session: Session = None
+    ) -> None:
+        '''Removes the version, or with `keep` every version except it.'''
+        condition = (
+            db.ScheduleVersion.id != version
+            if keep
+            else db.ScheduleVersion.id == version
+        )
+        condition = condition & db.ScheduleVersion.active.is_(False)
+        stale = select(db.ScheduleVersion.id).where(condition)
+        session.query(db.Schedule).filter(
+            db.Schedule.generation.in_(stale)
+        ).delete(synchronize_session=False)
+        session.query(db.ScheduleVersion).filter(condition).delete(
+            synchronize_session=False
+        )
         session.commit()
 
     @orm_function
-    def add_group(self, group, schedule, session: Session = None) -> None:
-        g = session.query(db.Group.id).filter(db.Group.group == group).first()
-        if g is None:
-            g = manager.add_group(group, session=session)
-        else:
-            g = g[0]
-
-        weekday: int
-        number: int
-        is_overline: bool
-
-        for i, lesson in enumerate(schedule):
-            if lesson is None:
-                continue
-            l_id = (
-                session.query(db.Lesson.id)
-                .filter(db.Lesson.name == lesson.name)
-                .first()
+    def bulk_load(
+        self,
+        groups: Dict[str, List[Optional[Any]]],
+        replace_all: bool = False,
+        session: Session = None,
+    ) -> int:
+        '''Loads the given groups as a new schedule version and publishes it.
+
+        The bot keeps serving the active version while the new one is
+        written and validated. Unless `replace_all` is set, the other
+        groups keep their current lessons.
+        '''
+        started = time.perf_counter()
+        version = self.stage(groups, replace_all, session=session)
+        try:
+            self.validate(version, session=session)
+        except ValueError:
+            self.discard(version, session=session)
+            raise
+        self.publish(version, session=session)
+
+        rows = (
+            session.query(db.Schedule)
+            .filter(
+                (db.Schedule.generation == version)
+                & db.Schedule.group.has(db.Group.group.in_(list(groups)))
             )
-            if l_id is None:
-                l_id = manager.add_lesson(lesson.name, session=session)
-            else:
-                l_id = l_id[0]
-            weekday = i // 14
-            is_overline = i % 2 == 0
-            number = i % 14 // 2 + 1
-
-            if lesson.author is not None:
-                a_id = (
-                    session.query(db.Author.id)
-                    .filter(db.Author.name == lesson.author)
-                    .first()
-                )
-                if a_id is None:
-                    a_id = manager.add_author(lesson.author, session=session)
-                else:
-                    a_id = a_id[0]
-            else:
-                a_id = None
-
-            if lesson.lesson_type is not None:
-                t_id = (
-                    session.query(db.LessonType.id)
-                    .filter(db.LessonType.type == lesson.lesson_type)
-                    .first()
+            .count()
+        )
+        elapsed = time.perf_counter() - started
+        logger.info(
+            'Bulk load: %d groups, %d rows in %.2fs (%.0f rows/s)',
+            len(groups),
+            rows,
+            elapsed,
+            rows / elapsed if elapsed else 0,
+        )
+        return rows
+
+    @orm_function
+    def diff_load(
+        self,
+        groups: Dict[str, List[Optional[Any]]],
+        session: Session = None,
+    ) -> Dict[str, GroupChanges]:
+        '''Applies only the changed lessons of the given groups.
+
+        Parsed lessons are compared with the active schedule version by
+        (group, weekday, overline, num); the resulting inserts, updates and
+        deletes are written in one transaction and the version revision is
+        bumped so the bot reloads its snapshot. Groups missing from
+        `groups` are left untouched.
+        '''
+        started = time.perf_counter()
+        version = (
+            session.query(db.ScheduleVersion)
+            .filter(db.ScheduleVersion.active.is_(True))
+            .with_for_update()
+            .first()
+        )
+        if version is None:
+            version = db.ScheduleVersion(active=True)
+            session.add(version)
+            session.flush()
+
+        parsed = {
+            slot_key(row): row
+            for row in self._schedule_rows(session, groups, version.id)
+        }
+        group_ids = name_map(session, db.Group.group)
+        loaded = [group_ids[group] for group in groups]
+        current = session.query(
+            db.Schedule.id,
+            db.Schedule.group_id,
+            db.Schedule.weekday,
+            db.Schedule.overline,
+            db.Schedule.num,
+            *(getattr(db.Schedule, field) for field in DIFF_FIELDS),
+        ).filter(
+            (db.Schedule.generation == version.id)
+            & db.Schedule.group_id.in_(loaded)
+        )
+
+        counter: Counter = Counter()
+        updates: List[Dict[str, Any]] = []
+        deletes: List[int] = []
+        for row in current:
+            old = row._asdict()
+            new = parsed.pop(slot_key(old), None)
+            if new is None:
+                deletes.append(old['id'])
+                counter[old['group_id'], 'deleted'] += 1
+            elif any(old[field] != new[field] for field in DIFF_FIELDS):
+                updates.append(
+                    {'id': old['id'], **{f: new[f] for f in DIFF_FIELDS}}
                 )
-                if t_id is None:
-                    print('No lesson type in db: ' + lesson.lesson_type)
-                else:
-                    t_id = t_id[0]
-            else:
-                t_id = None
-
-            manager.add_schedule(
-                g,
-                l_id,
-                a_id,
-                t_id,
-                number,
-                weekday,
-                is_overline,
-                lesson.auditory,
-                commit=False,
-                session=session,
-            )
+                counter[old['group_id'], 'updated'] += 1
+        inserts = list(parsed.values())
+        for row in inserts:
+            counter[row['group_id'], 'inserted'] += 1
 
+        if deletes:
+            session.query(db.Schedule).filter(
+                db.Schedule.id.in_(deletes)
+            ).delete(synchronize_session=False)
+        session.bulk_update_mappings(db.Schedule, updates)
+        session.bulk_insert_mappings(db.Schedule, inserts)
+        if counter:
+            version.revision += 1
         session.commit()
+
+        changes = {
+            group: GroupChanges(
+                counter[group_ids[group], 'inserted'],
+                counter[group_ids[group], 'updated'],
+                counter[group_ids[group], 'deleted'],
+            )
+            for group in groups
+        }
+        for group, group_changes in changes.items():
+            if any(group_changes):
+                logger.info('%s: %s', group, group_changes)
+        logger.info(
+            'Diff load: %d of %d groups changed (%d inserted, %d updated, '
+            '%d deleted) in %.2fs',
+            sum(1 for group_changes in changes.values() if any(group_changes)),
+            len(groups),
+            len(inserts),
+            len(updates),
+            len(deletes),
+            time.perf_counter() - started,
+        )
+        return changes
@@ -12,23 +12,28 @@ argument_parser.add_argument(
     default='./',
     help='directory with files',
 )
+argument_parser.add_argument(
+    '-r',
+    '--report',
+    dest='report',
+    action='store',
+    type=str,
+    default=None,
+    help='write incomplete and unnamed lessons to a JSON lines file',
+)
 argument_parser.add_argument(
     '-a',
     '--all',
-    dest='show',
-    action='store_const',
-    const='ALL',
-    default='NO',
-    help='show all lessons',
+    dest='report_all',
+    action='store_true',
+    help='report every lesson',
 )
 argument_parser.add_argument(
-    '-i',
-    '--incomplete',
-    dest='show',
-    action='store_const',
-    const='INCOMPLETE',
-    default='NO',
-    help='show only incomplete lessons',
+    '-s',
+    '--summary',
+    dest='summary',
+    action='store_true',
+    help='print a summary of the parsed files',
 )
 argument_parser.add_argument(
     '-b',
@@ -39,6 +44,21 @@ argument_parser.add_argument(
     default=DB_URL,
     help='database url (%s by defaul)' % DB_URL,
 )
+argument_parser.add_argument(
+    '-j',
+    '--jobs',
+    dest='jobs',
+    action='store',
+    type=int,
+    default=1,
+    help='number of processes parsing files (1 by default)',
+)
+argument_parser.add_argument(
+    '--no-cache',
+    dest='cache',
+    action='store_false',
+    help='parse every file again instead of using <dir>/.parse_cache',
+)
 argument_parser.add_argument(
     '--debug', dest='debug', action='store_true', help='set debug mode'
 )
@@ -49,3 +69,9 @@ argument_parser.add_argument(
     action='store_true',
     help='put data into database without dialog message',
 )
+argument_parser.add_argument(
+    '--diff',
+    dest='diff',
+    action='store_true',
+    help='write only changed lessons of the parsed groups',
+)
@@ -2,17 +2,49 @@ import asyncio
 import hashlib
 import os
 from pathlib import Path
-from typing import List
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+from urllib.parse import urljoin
 
 import aiofiles
 import aiohttp
-import requests
 from bs4 import BeautifulSoup
 
+from schedule_bot import DOWNLOAD_CONCURRENCY, DOWNLOAD_RETRIES
 from schedule_bot.updater import logger
 from schedule_bot.updater.storage import FilesStorage
 
-storage = FilesStorage()
+SCHEDULE_PAGE = r'https://istu.ru/material/raspisanie-zanyatiy'
+BUFFER_SIZE = 65536  # 64 kb
+# response header -> header of the conditional request
+VALIDATORS = {'ETag': 'If-None-Match', 'Last-Modified': 'If-Modified-Since'}
+RETRY_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+# client errors worth retrying, other 4xx fail at once
+RETRY_STATUSES = {429}
+
+
+class DownloadError(Exception):
+    pass
+
+
+class FileState(NamedTuple):
+    '''Hash and HTTP validators of a downloaded file not yet saved.'''
+
+    hash: str
+    validators: Dict[str, str]
+
+
+async def save_state(
+    storage: FilesStorage, name: str, state: FileState
+) -> None:
+    await storage.set(name, state.hash)
+    await storage.set_validators(name, state.validators)
+
+
+def is_transient(error: BaseException) -> bool:
+    '''Network errors, 5xx and 429 may pass on a retry.'''
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500 or error.status in RETRY_STATUSES
+    return True
 
 
 async def hash_bytes(bytes: bytes) -> str:
@@ -22,7 +54,6 @@ async def hash_bytes(bytes: bytes) -> str:
 
 
 async def hash_file(path: str) -> str:
-    BUFFER_SIZE = 65536  # 64 mb
     sha1 = hashlib.sha1()
 
     async with aiofiles.open(path, 'rb') as file:
@@ -32,60 +63,179 @@ async def hash_file(path: str) -> str:
     return sha1.hexdigest()
 
 
-async def download_file(link: str, name: str, dest: Path) -> None:
-    logger.info('Downloading %s', name)
-    async with aiohttp.ClientSession() as session:
-        async with session.get(link) as source:
-            data = await source.read()
+async def fetch_file(
+    session: aiohttp.ClientSession,
+    link: str,
+    name: str,
+    dest: Path,
+    storage: FilesStorage,
+    pending: Optional[Dict[str, FileState]] = None,
+) -> bool:
+    '''Streams the file to disk unless it is unchanged.
+
+    The body is written in chunks to a `.part` file while being hashed, so
+    memory use does not depend on the file size. The part file replaces the
+    old copy only if the hash differs. Returns True if the file changed.
+    With `pending` the state of a changed file is put there instead of the
+    storage, for the caller to save once the file is processed.
+    '''
+    path = dest / name
+    headers: Dict[str, str] = {}
+    if path.exists():
+        validators = await storage.get_validators(name)
+        headers = {
+            VALIDATORS[header]: value
+            for header, value in validators.items()
+            if header in VALIDATORS
+        }
 
-    file_hash = await hash_bytes(data)
-    stored_file_hash = await storage.getset(name, file_hash)
-    save = (dest / name).exists() or file_hash != stored_file_hash
+    logger.info('Downloading %s', name)
+    part = dest / f'{name}.part'
+    sha1 = hashlib.sha1()
+    async with session.get(link, headers=headers) as source:
+        if source.status == 304:
+            logger.info('File %s is not modified (skip)', name)
+            return False
+        source.raise_for_status()
+        validators = {
+            header: source.headers[header]
+            for header in VALIDATORS
+            if header in source.headers
+        }
+        async with aiofiles.open(part, 'wb') as file:
+            async for chunk in source.content.iter_chunked(BUFFER_SIZE):
+                sha1.update(chunk)
+                await file.write(chunk)
+
+    file_hash = sha1.hexdigest()
+    changed = not path.exists() or file_hash != await storage.get(name)
     logger.info(
         'File hash (%s): %s %s',
         name,
         file_hash,
-        '(skip)' if not save else '',
+        '(skip)' if not changed else '',
     )
 
-    # TODO download and parse only new files
-    async with aiofiles.open(dest / name, 'wb') as file:
-        await file.write(data)
-
-
-async def download(dest: str = './') -> List[str]:
+    state = FileState(file_hash, validators)
+    if changed:
+        os.replace(part, path)
+        if pending is not None:
+            pending[name] = state
+        else:
+            await save_state(storage, name, state)
+    else:
+        part.unlink()
+        await storage.set_validators(name, validators)
+    return changed
+
+
+async def download_file(
+    session: aiohttp.ClientSession,
+    link: str,
+    name: str,
+    dest: Path,
+    storage: FilesStorage,
+    retries: int = DOWNLOAD_RETRIES,
+    backoff: float = 1.0,
+    pending: Optional[Dict[str, FileState]] = None,
+) -> bool:
+    '''`fetch_file` retried with exponential backoff on transient errors.'''
+    for attempt in range(retries + 1):
+        try:
+            return await fetch_file(
+                session, link, name, dest, storage, pending
+            )
+        except RETRY_ERRORS as error:
+            if attempt == retries or not is_transient(error):
+                raise
+            delay = backoff * 2**attempt
+            logger.warning(
+                'Download of %s failed (%s), retry in %.1fs',
+                name,
+                error,
+                delay,
+            )
+            await asyncio.sleep(delay)
+    return False
+
+
+def parse_links(html: str, page: str) -> List[str]:
+    soup = BeautifulSoup(html, 'html.parser')
+    table = soup.find('table', attrs={'class': 'istu-table'}).find('tbody')
+    hrefs = table.find_all('a', href=True)
+    return [urljoin(page, href['href']) for href in hrefs]
+
+
+async def download(
+    dest: str = './',
+    storage: Optional[FilesStorage] = None,
+    page: str = SCHEDULE_PAGE,
+    concurrency: int = DOWNLOAD_CONCURRENCY,
+    retries: int = DOWNLOAD_RETRIES,
+    on_changed: Optional[Callable[[Path], Awaitable[None]]] = None,
+    on_failed: Optional[Callable[[str], Awaitable[None]]] = None,
+    pending: Optional[Dict[str, FileState]] = None,
+) -> List[Path]:
+    '''Downloads the timetables and returns the paths of changed files.
+
+    All requests share one session whose connection pool, like the number
+    of files downloaded at once, is limited to `concurrency`. `on_changed`
+    is awaited with every changed file as soon as it is on disk and
+    `on_failed` with the name of every file that failed after its retries.
+    Raises `DownloadError` if the list of files cannot be fetched.
+    `pending` is passed to `fetch_file`.
+    '''
+    storage = storage if storage is not None else FilesStorage()
     dest_path = Path(dest)
     dest_path.mkdir(parents=True, exist_ok=True)
-    schedule_page = r'https://istu.ru/material/raspisanie-zanyatiy'
-    main_page = r'https://istu.ru/'
-    page = requests.get(schedule_page)
-    links = []
-
-    if page.status_code == 200:
-        soup = BeautifulSoup(page.text.encode('utf-8'), 'html.parser')
-        table = soup.find('table', attrs={'class': 'istu-table'}).find('tbody')
-        hrefs = table.find_all('a', href=True)
-        for href in hrefs:
-            link = href['href']
-            links.append(main_page + link)
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
 
-        logger.info('Fetch %d files. Downloading...', len(links))
-        filenames = list(map(lambda l: l.split('/')[-1], links))
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async with session.get(page) as response:
+            if response.status != 200:
+                raise DownloadError(f'schedule page status {response.status}')
+            links = parse_links(await response.text(), page)
 
-        if os.name == 'nt':
-            logger.debug('Using Windows event loop policy')
-            asyncio.set_event_loop_policy(
-                asyncio.WindowsSelectorEventLoopPolicy()
-            )
-
-        tasks = [
-            asyncio.create_task(download_file(link, name, dest_path))
-            for link, name in zip(links, filenames)
-        ]
-        await asyncio.gather(*tasks)
-        logger.info('Finished')
-        return list(map(lambda name: dest_path / name, filenames))
-    return []
+        logger.info('Fetch %d files. Downloading...', len(links))
+        filenames = [link.split('/')[-1] for link in links]
+
+        async def limited(link: str, name: str) -> bool:
+            async with semaphore:
+                try:
+                    changed = await download_file(
+                        session,
+                        link,
+                        name,
+                        dest_path,
+                        storage,
+                        retries,
+                        pending=pending,
+                    )
+                except RETRY_ERRORS:
+                    logger.exception('Failed to download %s', name)
+                    if on_failed is not None:
+                        await on_failed(name)
+                    return False
+                if changed and on_changed is not None:
+                    await on_changed(dest_path / name)
+                return changed
+
+        changed = await asyncio.gather(
+            *(limited(link, name) for link, name in zip(links, filenames))
+        )
+
+    changed_files = [
+        dest_path / name
+        for name, is_changed in zip(filenames, changed)
+        if is_changed
+    ]
+    logger.info(
+        'Finished: %d of %d files changed',
+        len(changed_files),
+        len(filenames),
+    )
+    return changed_files
 
 
 if __name__ == '__main__':
@@ -1,19 +1,45 @@
 from __future__ import annotations
 
+import hashlib
 import logging
 import os
 import re
-from typing import Any, Dict, List, Optional, Set, Union
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 import colorama
 import numpy as np
 import xlrd
 
-from schedule_bot.updater import Updater, regexp
+from schedule_bot.updater import Updater, regexp, xlsx
 from schedule_bot.updater.arguments import argument_parser
+from schedule_bot.updater.parse_cache import ParseCache, file_sha1
+from schedule_bot.updater.report import ReportWriter
 
 
 class Lesson:
+    # a semester import keeps hundreds of thousands of lessons in memory
+    __slots__ = (
+        'name',
+        'author',
+        'auditory',
+        'lesson_type',
+        'department',
+        'raw',
+    )
+
     def __init__(
         self,
         name: str,
@@ -71,9 +97,44 @@ class Counter:
     incomplete: int = 0
     total: int = 0
     unnamed: int = 0
+    cached: int = 0
+
+    def __init__(self) -> None:
+        # cache name -> (hits, misses)
+        self.caches: Dict[str, Tuple[int, int]] = {}
+
+    def merge(self, other: Counter) -> None:
+        self.errors += other.errors
+        self.passed += other.passed
+        self.incomplete += other.incomplete
+        self.total += other.total
+        self.unnamed += other.unnamed
+        self.cached += other.cached
+        for name, (hits, misses) in other.caches.items():
+            old_hits, old_misses = self.caches.get(name, (0, 0))
+            self.caches[name] = (old_hits + hits, old_misses + misses)
+
+    def to_dict(self) -> Dict[str, Any]:
+        counts: Dict[str, Any] = {
+            field: getattr(self, field) for field in COUNTER_FIELDS
+        }
+        counts["cached"] = self.cached
+        counts["caches"] = {
+            name: {"hits": hits, "misses": misses}
+            for name, (hits, misses) in self.caches.items()
+        }
+        return counts
+
+    def cache_summary(self) -> str:
+        lines = []
+        for name, (hits, misses) in self.caches.items():
+            calls = hits + misses
+            rate = hits / calls if calls else 0
+            lines.append(f'Cache {name}: {rate:.0%} hits ({hits}/{calls})')
+        return '\n'.join(lines)
 
     def __str__(self) -> str:
-        return 'Total: {0}\n{5}Incomplete: {1}{8}\n{6}Passed: {2}{8}\n{7}Unnamed: {3}{8}\n{7}Errors: {4}{8}'.format(
+        summary = 'Total: {0}\n{5}Incomplete: {1}{8}\n{6}Passed: {2}{8}\n{7}Unnamed: {3}{8}\n{7}Errors: {4}{8}'.format(
             self.total,
             self.incomplete,
             self.passed,
@@ -84,8 +145,51 @@ class Counter:
             colorama.Fore.RED,
             colorama.Fore.RESET,
         )
-
-
+        if self.caches:
+            summary += '\n' + self.cache_summary()
+        if self.cached:
+            summary += f'\nCached files: {self.cached}'
+        return summary
+
+
+AUTHOR_RE = re.compile(regexp.AUTHOR)
+DEPARTMENT_RE = re.compile(regexp.DEPARTMENT)
+CLASSROOM_RE = re.compile(regexp.CLASSROOM, re.IGNORECASE)
+LESSON_TYPE_RE = re.compile(regexp.LESSON_TYPE, re.IGNORECASE)
+LESSON_RE = re.compile(regexp.LESSON)
+LESSON_NO_AUTHOR_RE = re.compile(regexp.LESSON_NO_AUTHOR)
+GROUP_RE = re.compile(regexp.GROUP)
+
+AUTHOR_TITLE_RE = re.compile(r"^(?P<t>\s*((пр\.)|(доц\.)|(проф\.))\s*)")
+WORD_RE = re.compile(r"\w+")
+IZHVODOKANAL_RE = re.compile("ижводоканал", re.IGNORECASE)
+COMPANY_RE = re.compile(r"ООО\s?(?P<name>[«\"][\w-]+[»\"])", re.IGNORECASE)
+EOIDOT_RE = re.compile(r"ЭОиДОТ", re.IGNORECASE)
+IZHNT_RE = re.compile(r"ИжНТ", re.IGNORECASE)
+AUDITORY_TRASH_RE = re.compile(r"(\s)|(к.)|(К.)")
+LECTURE_RE = re.compile(r"(леке?ц?и?я?\.*)", re.IGNORECASE)
+PRACTICE_RE = re.compile(r"(практ?и?к?а?\.*)", re.IGNORECASE)
+
+# merged cells repeat the same text in every covered position
+LESSON_CACHE_SIZE = 8192
+NORMALIZE_CACHE_SIZE = 2048
+
+
+class ParsedLesson(NamedTuple):
+    name: Optional[str]
+    author: Optional[str]
+    auditory: Optional[str]
+    lesson_type: Optional[str]
+    department: Optional[str]
+    raw: str
+
+
+def intern_text(text: Optional[str]) -> Optional[str]:
+    '''One copy of every teacher, subject and room name in the process.'''
+    return None if text is None else sys.intern(text)
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def normalize_name(name: str, start_pos: Optional[int] = None) -> str:
     sp = start_pos is not None
     LONG_NAMES = ['аль аккад мхд айман']
@@ -95,7 +199,7 @@ def normalize_name(name: str, start_pos: Optional[int] = None) -> str:
             return name, start_pos
         return name
 
-    names: List[str] = re.findall(r"\w+", name)
+    names: List[str] = WORD_RE.findall(name)
     if len(names) > 3:
         if sp:
             start_pos += len(" ".join(names)) - len(" ".join(names[-3:]))
@@ -109,30 +213,32 @@ def normalize_name(name: str, start_pos: Optional[int] = None) -> str:
     return f"{names[0].capitalize()} {names[1][0]}.{names[2][0]}."
 
 
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def normalize_auditory(s: str) -> str:
     s = s.strip()
-    if re.search("ижводоканал", s, re.IGNORECASE) is not None:
+    if IZHVODOKANAL_RE.search(s) is not None:
         return "МУП «Ижводоканал»"
-    f = re.search(r"ООО\s?(?P<name>[«\"][\w-]+[»\"])", s, re.IGNORECASE)
+    f = COMPANY_RE.search(s)
     if f is not None:
         return f"ООО {f.group('name')}"
-    if re.search(r"ЭОиДОТ", s, re.IGNORECASE) is not None:
+    if EOIDOT_RE.search(s) is not None:
         return "ЭОиДОТ"
-    if re.search(r"ИжНТ", s, re.IGNORECASE) is not None:
+    if IZHNT_RE.search(s) is not None:
         return "ИжНТ"
 
-    s = re.sub(r"(\s)|(к.)|(К.)", "", s)
+    s = AUDITORY_TRASH_RE.sub("", s)
     return s
 
 
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def normalize_lesson_type(s: str) -> str:
     s = s.strip()
     types = s.split("+")
     final_type = []
     for tp in types:
-        if re.search(r"(леке?ц?и?я?\.*)", tp, re.IGNORECASE) is not None:
+        if LECTURE_RE.search(tp) is not None:
             final_type.append("лек")
-        elif re.search(r"(практ?и?к?а?\.*)", tp, re.IGNORECASE) is not None:
+        elif PRACTICE_RE.search(tp) is not None:
             final_type.append("практ")
         else:
             final_type.append("лаб")
@@ -140,38 +246,32 @@ def normalize_lesson_type(s: str) -> str:
     return "+".join(final_type)
 
 
-def parse_lesson_exp(lesson_line: str) -> Lesson:
-    lesson_line = lesson_line.replace("\n", " ")
+@lru_cache(maxsize=LESSON_CACHE_SIZE)
+def parse_lesson_line(lesson_line: str) -> ParsedLesson:
+    '''Parses a lesson cell with its line breaks replaced by spaces.'''
     raw_line = lesson_line
 
-    authorname_re = re.compile(regexp.AUTHOR)
-    department_re = re.compile(regexp.DEPARTMENT)
-    classroom_re = re.compile(regexp.CLASSROOM, re.IGNORECASE)
-    lesson_type_re = re.compile(regexp.LESSON_TYPE, re.IGNORECASE)
-    lesson_re = re.compile(regexp.LESSON)
-    lesson_re_no_author = re.compile(regexp.LESSON_NO_AUTHOR)
-
     delta = 0
-    author = authorname_re.search(lesson_line)
+    author = AUTHOR_RE.search(lesson_line)
     if author is not None:
         asp = author.span("ath")[0]
         g = author.group(0)
-        t = re.search(r"^(?P<t>\s*((пр\.)|(доц\.)|(проф\.))\s*)", g)
+        t = AUTHOR_TITLE_RE.search(g)
         if t is not None:
             delta = len(t.group("t"))
 
         author = author.group("ath").rstrip()
 
-    department = department_re.search(lesson_line)
+    department = DEPARTMENT_RE.search(lesson_line)
     if department is not None:
         department = department.group("dep")
         lesson_line = lesson_line.replace(department, '*' * len(department), 1)
 
-    auditory = classroom_re.search(lesson_line)
+    auditory = CLASSROOM_RE.search(lesson_line)
     if auditory is not None:
         auditory = normalize_auditory(auditory.group(0))
 
-    lesson_type_group = lesson_type_re.search(lesson_line)
+    lesson_type_group = LESSON_TYPE_RE.search(lesson_line)
     if lesson_type_group is not None:
         lesson_type = normalize_lesson_type(lesson_type_group.group("type"))
     else:
@@ -185,129 +285,409 @@ def parse_lesson_exp(lesson_line: str) -> Lesson:
         author_start_pos = len(lesson_line)
 
     if author is None:
-        lesson_name = lesson_re_no_author.search(lesson_line)
+        lesson_name = LESSON_NO_AUTHOR_RE.search(lesson_line)
     else:
-        lesson_name = lesson_re.search(lesson_line, endpos=author_start_pos)
+        lesson_name = LESSON_RE.search(lesson_line, endpos=author_start_pos)
     if lesson_name is not None:
         lesson_name = lesson_name.group("name").strip(", ")
 
-    return Lesson(
-        lesson_name,
-        author=author,
-        department=department,
-        raw=raw_line,
-        auditory=auditory,
-        lesson_type=lesson_type,
+    return ParsedLesson(
+        intern_text(lesson_name),
+        intern_text(author),
+        intern_text(auditory),
+        intern_text(lesson_type),
+        intern_text(department),
+        raw_line,
     )
 
 
-PREFIX = 0
+def parse_lesson_exp(lesson_line: str, keep_raw: bool = True) -> Lesson:
+    '''Without `keep_raw` the cell text is not kept in the lesson.'''
+    parsed = parse_lesson_line(lesson_line.replace("\n", " "))
+    if keep_raw:
+        return Lesson(*parsed)
+    return Lesson(*parsed[:-1])
+
+
+CACHED_FUNCTIONS = {
+    "lessons": parse_lesson_line,
+    "names": normalize_name,
+    "auditories": normalize_auditory,
+    "lesson types": normalize_lesson_type,
+}
+
+
+def cache_counters() -> Dict[str, Tuple[int, int]]:
+    '''(hits, misses) of every parsing cache in this process.'''
+    return {
+        name: (func.cache_info().hits, func.cache_info().misses)
+        for name, func in CACHED_FUNCTIONS.items()
+    }
+
+
+# the parser and the update command pick up files with these extensions
+WORKBOOK_EXTENSIONS = (".xls", ".xlsx")
+
+
+def iter_xls_tables(tablename: str) -> Iterator[Tuple[str, np.ndarray]]:
+    data = xlrd.open_workbook(tablename, formatting_info=True, on_demand=True)
+    try:
+        for sheet_id in range(data.nsheets):
+            sheet = data.sheet_by_index(sheet_id)
+
+            mat: np.ndarray = np.empty((sheet.ncols, sheet.nrows), object)
+
+            for ncol in range(sheet.ncols):
+                mat[ncol] = sheet.col_values(ncol)
+
+            # every cell of a merged range gets the value of its top left cell
+            for (row_lo, row_hi, col_lo, col_hi) in sheet.merged_cells:
+                mat[col_lo:col_hi, row_lo:row_hi] = sheet.cell_value(
+                    row_lo, col_lo
+                )
+
+            yield sheet.name, mat
+            data.unload_sheet(sheet_id)
+    finally:
+        data.release_resources()
+
+
+def iter_tables(tablename: str) -> Iterator[Tuple[str, np.ndarray]]:
+    '''Sheets of a .xls or .xlsx workbook as matrices, one at a time.'''
+    if tablename.lower().endswith(".xlsx"):
+        return xlsx.read_sheets(tablename)
+    return iter_xls_tables(tablename)
 
 
 def parse_table(tablename: str) -> Dict[str, np.ndarray]:
-    global PREFIX
-    data = xlrd.open_workbook(tablename, formatting_info=True)
-    mats = {}
-
-    for sheet_id in range(data.nsheets):
-        sheet = data.sheet_by_index(sheet_id)
-
-        mat: np.ndarray = np.empty((sheet.ncols, sheet.nrows), object)
-
-        merged_cells = sheet.merged_cells
-
-        for ncol in range(sheet.ncols):
-            for nrow in range(sheet.nrows):
-                mat[ncol][nrow] = sheet[nrow][ncol].value
-
-        for (x0, x1, y0, y1) in merged_cells:
-            cell_data = sheet[x0][y0].value
-            for x in range(x0, x1):
-                for y in range(y0, y1):
-                    mat[y][x] = cell_data
-
-        mats.update({sheet.name + str(PREFIX): mat})
-        PREFIX += 1
-    return mats
-
-
-def parse_sheet(sheet: np.ndarray) -> Dict[str, List[Optional[Lesson]]]:
-    global SHOW
-    global PROGRESS
-
-    global LESSONS_SET
-    global AUTHORS_SET
-
-    lessons = {}
-    cols, rows = sheet.shape
-    GROUP_REGEX = re.compile(regexp.GROUP)
-
-    for x in range(cols):
-        for y in range(rows):
-            if GROUP_REGEX.match(sheet[x][y]) is not None:
-                group = sheet[x][y].split("\n")[0]
-
-                logging.debug("GROUP: %s", group)
-                ls = []
-                for d in range(1, 85):
-                    lesson = sheet[x][y + d]
-                    if lesson.strip() != "":
-                        COUNTER.total += 1
-                        try:
-                            lesson_info = parse_lesson_exp(sheet[x][y + d])
-
-                            if lesson_info is not None:
-                                if lesson_info.name is not None:
-                                    LESSONS_SET.add(lesson_info.name)
-                                if lesson_info.author is not None:
-                                    AUTHORS_SET.add(lesson_info.author)
-
-                                if SHOW == "ALL":
-                                    if PROGRESS:
-                                        tqdm.write(lesson_info.__str__())
-                                    else:
-                                        print(lesson_info)
-                                if not lesson_info.is_full():
-                                    if SHOW == "INCOMPLETE":
-                                        if PROGRESS:
-                                            tqdm.write(lesson_info.__str__())
-                                        else:
-                                            print(lesson_info)
-                                    COUNTER.incomplete += 1
-                                if lesson_info.name is None:
-                                    COUNTER.unnamed += 1
-                            ls.append(lesson_info)
-                            COUNTER.passed += 1
-                        except AttributeError:
-                            logging.error(lesson.replace("\n", " "))
-                            COUNTER.errors += 1
-
-                    else:
-                        ls.append(None)
-                lessons.update({group: ls})
-
-    return lessons
+    return dict(iter_tables(tablename))
 
 
-colorama.init(convert=True)
+# 6 days x 7 lessons x 2 (over and under the line)
+LESSONS_PER_WEEK = 84
+# bounds of a group header like "Б22-191-1\nИВТ" used by the prefilter
+HEADER_MIN_LENGTH = 9
+HEADER_MAX_LENGTH = 256
+
+
+def _is_header_candidate(value: Any) -> bool:
+    return (
+        isinstance(value, str)
+        and HEADER_MIN_LENGTH <= len(value) <= HEADER_MAX_LENGTH
+        and value[3] == "-"
+    )
+
+
+def _is_filled(value: Any) -> bool:
+    return isinstance(value, str) and value.strip() != ""
+
+
+is_header_candidate = np.frompyfunc(_is_header_candidate, 1, 1)
+is_filled = np.frompyfunc(_is_filled, 1, 1)
+
+
+def find_groups(sheet: np.ndarray) -> List[Tuple[int, int, str]]:
+    '''(column, row, group) of every group header, column by column.'''
+    candidates = np.argwhere(is_header_candidate(sheet).astype(bool))
+    return [
+        (x, y, sheet[x, y].split("\n")[0])
+        for x, y in candidates
+        if GROUP_RE.match(sheet[x, y]) is not None
+    ]
+
+
+Groups = Dict[str, List[Optional[Lesson]]]
+# a lesson of the report, see `Parser`
+Issue = Dict[str, Any]
+
+
+class ParseResult(NamedTuple):
+    groups: Groups
+    lessons: Set[str]
+    authors: Set[str]
+    counter: Counter
+    issues: List[Issue]
+
+    @classmethod
+    def empty(cls) -> ParseResult:
+        return cls({}, set(), set(), Counter(), [])
 
+    def merge(self, other: ParseResult) -> None:
+        self.groups.update(other.groups)
+        self.lessons.update(other.lessons)
+        self.authors.update(other.authors)
+        self.counter.merge(other.counter)
+        self.issues.extend(other.issues)
 
-COUNTER = Counter()
-SHOW = "ALL"
-PROGRESS = True
 
-LESSONS_SET: Set[str] = set()
-AUTHORS_SET: Set[str] = set()
+# kept for the callers of the tuple based interface
+FileResult = ParseResult
+
+
+# bump when parse results change for reasons other than the patterns
+PARSE_CACHE_FORMAT = 3
+COUNTER_FIELDS = ("errors", "passed", "incomplete", "total", "unnamed")
+
+
+def parser_version() -> str:
+    '''Hash of every compiled pattern of the parser.'''
+    patterns = sorted(
+        (name, value.pattern, value.flags)
+        for name, value in globals().items()
+        if isinstance(value, re.Pattern)
+    )
+    data = repr((PARSE_CACHE_FORMAT, patterns)).encode("utf-8")
+    return hashlib.sha1(data).hexdigest()[:12]
+
+
+PARSER_VERSION = parser_version()
+
+
+def dump_result(result: ParseResult) -> Dict[str, Any]:
+    '''Converts a parse result to builtin types for the parse cache.
+
+    The cell text of the lessons is not stored, the issues keep their own.
+    '''
+    groups, lessons_set, authors_set, counter, issues = result
+    return {
+        "groups": {
+            group: [
+                None
+                if lesson is None
+                else (
+                    lesson.name,
+                    lesson.author,
+                    lesson.auditory,
+                    lesson.lesson_type,
+                    lesson.department,
+                )
+                for lesson in lessons
+            ]
+            for group, lessons in groups.items()
+        },
+        "lessons": sorted(lessons_set),
+        "authors": sorted(authors_set),
+        "counter": {
+            field: getattr(counter, field) for field in COUNTER_FIELDS
+        },
+        "issues": issues,
+    }
+
+
+def load_result(payload: Dict[str, Any]) -> ParseResult:
+    counter = Counter()
+    for field, value in payload["counter"].items():
+        setattr(counter, field, value)
+    counter.cached = 1
+    groups = {
+        group: [
+            None
+            if fields is None
+            else Lesson(*(intern_text(field) for field in fields))
+            for fields in lessons
+        ]
+        for group, lessons in payload["groups"].items()
+    }
+    return ParseResult(
+        groups,
+        set(payload["lessons"]),
+        set(payload["authors"]),
+        counter,
+        payload["issues"],
+    )
+
+
+def issue(
+    sheet_name: str,
+    group: str,
+    x: int,
+    y: int,
+    problems: List[str],
+    raw: str,
+    lesson: Optional[Lesson] = None,
+) -> Issue:
+    record: Issue = {
+        "sheet": sheet_name,
+        "cell": xlrd.formula.cellname(y, x),
+        "group": group,
+        "problems": problems,
+        "raw": raw,
+    }
+    if lesson is not None:
+        record.update(
+            name=lesson.name,
+            author=lesson.author,
+            auditory=lesson.auditory,
+            lesson_type=lesson.lesson_type,
+            department=lesson.department,
+        )
+    return record
+
+
+class Parser:
+    '''Parses workbooks into lessons grouped by student group.
+
+    A parser owns its result, so several parsers can run at the same time
+    in one process. A single instance must not be shared between threads.
+    Incomplete, unnamed and broken lessons are collected in
+    `result.issues` with their sheet and cell, every lesson with
+    `report_all`. The cell text is kept in the lessons only with
+    `keep_raw`. The lesson caches are shared by the process, so their hit
+    counts are approximate while other parsers run in parallel threads.
+    '''
+
+    def __init__(
+        self,
+        cache: Optional[ParseCache] = None,
+        keep_raw: bool = False,
+        report_all: bool = False,
+    ) -> None:
+        self.cache = cache
+        self.keep_raw = keep_raw
+        self.report_all = report_all
+        # everything parsed by this instance
+        self.result = ParseResult.empty()
+
+    def _parse_sheet(
+        self, sheet_name: str, sheet: np.ndarray, result: ParseResult
+    ) -> Groups:
+        counter = result.counter
+        lessons = {}
+
+        for x, y, group in find_groups(sheet):
+            logging.debug("GROUP: %s", group)
+            column = sheet[x, y + 1:y + 1 + LESSONS_PER_WEEK]
+            ls: List[Optional[Lesson]] = []
+            # only the lesson cells of the group, not the whole sheet
+            cells = zip(column, is_filled(column).astype(bool))
+            for row, (lesson, is_lesson) in enumerate(cells, y + 1):
+                if not is_lesson:
+                    ls.append(None)
+                    continue
+
+                counter.total += 1
+                try:
+                    lesson_info = parse_lesson_exp(lesson, self.keep_raw)
+                except AttributeError:
+                    raw = lesson.replace("\n", " ")
+                    logging.error(raw)
+                    counter.errors += 1
+                    result.issues.append(
+                        issue(sheet_name, group, x, row, ["error"], raw)
+                    )
+                    continue
+
+                if lesson_info.name is not None:
+                    result.lessons.add(lesson_info.name)
+                if lesson_info.author is not None:
+                    result.authors.add(lesson_info.author)
+                problems = []
+                if not lesson_info.is_full():
+                    counter.incomplete += 1
+                    problems.append("incomplete")
+                if lesson_info.name is None:
+                    counter.unnamed += 1
+                    problems.append("unnamed")
+                if problems or self.report_all:
+                    result.issues.append(
+                        issue(
+                            sheet_name,
+                            group,
+                            x,
+                            row,
+                            problems,
+                            lesson.replace("\n", " "),
+                            lesson_info,
+                        )
+                    )
+                ls.append(lesson_info)
+                counter.passed += 1
+
+            # a header near the bottom of the sheet gets a short column
+            ls.extend([None] * (LESSONS_PER_WEEK - len(ls)))
+            lessons.update({group: ls})
+
+        result.groups.update(lessons)
+        return lessons
+
+    def parse_sheet(self, sheet: np.ndarray, sheet_name: str = "") -> Groups:
+        return self._parse_sheet(sheet_name, sheet, self.result)
+
+    def parse_file(self, tablename: str) -> ParseResult:
+        '''Result of one workbook, also added to `self.result`.'''
+        if self.cache is not None:
+            # reports of every lesson are cached apart from the issues only
+            file_hash = file_sha1(tablename)
+            if self.report_all:
+                file_hash += "-all"
+            payload = self.cache.load(file_hash)
+            if (
+                payload is not None
+                and payload.get("report_all") == self.report_all
+            ):
+                logging.debug("Cached file: %s", tablename)
+                result = load_result(payload)
+                self.result.merge(result)
+                return result
+
+        result = ParseResult.empty()
+        caches = cache_counters()
+
+        logging.debug("Parsing file: %s", tablename)
+        for sheet_name, sheet in iter_tables(tablename):
+            logging.debug("\tSHEET: %s", sheet_name)
+            self._parse_sheet(sheet_name, sheet, result)
+
+        result.counter.caches = {
+            name: (hits - caches[name][0], misses - caches[name][1])
+            for name, (hits, misses) in cache_counters().items()
+        }
+        if self.cache is not None:
+            payload = dump_result(result)
+            payload["report_all"] = self.report_all
+            self.cache.store(file_hash, payload)
+        self.result.merge(result)
+        return result
+
+
+def parse_sheet(sheet: np.ndarray) -> Groups:
+    return Parser().parse_sheet(sheet)
+
+
+def parse_file(
+    tablename: str,
+    cache: Optional[ParseCache] = None,
+    report_all: bool = False,
+) -> ParseResult:
+    return Parser(cache, report_all=report_all).parse_file(tablename)
+
+
+def parse_files(
+    files: List[str],
+    jobs: int = 1,
+    cache: Optional[ParseCache] = None,
+    report_all: bool = False,
+) -> Iterator[ParseResult]:
+    '''Parses workbooks in `jobs` processes, yielding results in order.'''
+    parse = partial(parse_file, cache=cache, report_all=report_all)
+    if jobs <= 1:
+        yield from map(parse, files)
+        return
+
+    with ProcessPoolExecutor(jobs) as executor:
+        yield from executor.map(parse, files)
+
+
+colorama.init(convert=True)
 
 try:
     from tqdm import tqdm
 except ImportError:
-    PROGRESS = False
+    tqdm = None
 
 if __name__ == "__main__":
     args = argument_parser.parse_args()
 
-    SHOW = args.show
     db_url: str = args.db
     filedir: str = args.dir
     DEBUG: bool = args.debug
@@ -317,47 +697,57 @@ if __name__ == "__main__":
     else:
         logging.basicConfig(level=logging.ERROR)
 
-    lessons: Dict[str, List[Optional[Lesson]]] = {}
+    total = ParseResult.empty()
     files: List[str] = []
 
     for file in os.listdir(filedir):
-        ext = file.split(".")[-1]
-        if ext == "xls":
+        if file.lower().endswith(WORKBOOK_EXTENSIONS):
             logging.debug("Added %s", file)
             files.append(os.path.join(filedir, file))
         else:
             logging.debug("Skiped %s", file)
 
-    if PROGRESS:
-        files = tqdm(files, position=0, leave=True, desc="files")
+    cache = None
+    if args.cache:
+        cache_dir = os.path.join(filedir, ".parse_cache")
+        cache = ParseCache(cache_dir, PARSER_VERSION)
+        cache.prune()
 
-    for table in files:
-        logging.debug("Parsing file: %s", table)
-        sheets = parse_table(table)
-        for sheet_name, sheet in sheets.items():
-            logging.debug("\tSHEET: %s", sheet_name)
-            group_schedule = parse_sheet(sheet)
-            lessons.update(group_schedule)
+    report = None
+    if args.report:
+        report = ReportWriter(args.report)
+
+    results = parse_files(files, args.jobs, cache, args.report_all)
+    if tqdm is not None:
+        results = tqdm(
+            results, total=len(files), position=0, leave=True, desc="files"
+        )
 
-    logging.info(str(COUNTER))
+    for file, result in zip(files, results):
+        if report is not None:
+            report.write_result(file, result)
+        # the issues are in the report already
+        result.issues.clear()
+        total.merge(result)
+    lessons = total.groups
+
+    if report is not None:
+        report.write_summary(total)
+        report.close()
+    if args.summary:
+        print(total.counter)
+        print(
+            "Groups: %d, lessons: %d, authors: %d"
+            % (len(lessons), len(total.lessons), len(total.authors))
+        )
 
     is_updating: str = input("Put data into database (%s)? [y/n]: " % db_url)
-    if is_updating.lower() == "y":
-        upd = Updater()
-        upd.clear_schedule()
-        print("Adding lessons list: ", end="")
-        upd.add_lessons(LESSONS_SET)
-        print("OK")
-        print("Adding authors list: ", end="")
-        upd.add_authors(AUTHORS_SET)
-        print("OK")
-
-        if PROGRESS:
-            lessons_list = tqdm(lessons.items())
-        else:
-            lessons_list = lessons.items()
-
-        for group, sch in lessons_list:
-            upd.add_group(group, sch)
+    if is_updating.lower() == "y" and args.diff:
+        Updater().diff_load(lessons)
+    elif is_updating.lower() == "y":
+        try:
+            Updater().bulk_load(lessons, replace_all=True)
+        except ValueError as error:
+            logging.error("Schedule is not updated: %s", error)
     else:
         logging.info('abort')
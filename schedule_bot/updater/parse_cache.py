@@ -0,0 +1,67 @@
+import hashlib
+import os
+import pickle
+import zlib
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from schedule_bot.updater import logger
+
+BUFFER_SIZE = 65536  # 64 kb
+
+
+def file_sha1(path: Union[str, Path]) -> str:
+    '''Synchronous twin of `downloader.hash_file` for the parser processes.'''
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as file:
+        while file_bytes := file.read(BUFFER_SIZE):
+            sha1.update(file_bytes)
+    return sha1.hexdigest()
+
+
+class ParseCache:
+    '''Parse results stored on disk, one compressed pickle per workbook.
+
+    Entries are keyed by the SHA1 of the workbook and by `version`, which
+    the parser derives from its patterns, so editing `regexp.py` makes the
+    old entries unreachable. Payloads must consist of builtin types only.
+    '''
+
+    suffix = '.pickle.z'
+
+    def __init__(self, directory: Union[str, Path], version: str) -> None:
+        self.directory = Path(directory)
+        self.version = version
+
+    def _path(self, file_hash: str) -> Path:
+        return self.directory / f'{file_hash}.{self.version}{self.suffix}'
+
+    def load(self, file_hash: str) -> Optional[Any]:
+        path = self._path(file_hash)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            return pickle.loads(zlib.decompress(data))
+        except (zlib.error, pickle.UnpicklingError, EOFError) as error:
+            logger.warning('Broken parse cache entry %s: %s', path, error)
+            return None
+
+    def store(self, file_hash: str, payload: Any) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(file_hash)
+        data = zlib.compress(pickle.dumps(payload, pickle.HIGHEST_PROTOCOL))
+        # parser processes may store the same workbook at the same time
+        part = path.with_name(f'{path.name}.{os.getpid()}')
+        part.write_bytes(data)
+        os.replace(part, path)
+
+    def prune(self) -> int:
+        '''Removes entries of other parser versions.'''
+        removed = 0
+        for path in self.directory.glob(f'*{self.suffix}'):
+            if not path.name.endswith(f'.{self.version}{self.suffix}'):
+                path.unlink()
+                removed += 1
+        return removed
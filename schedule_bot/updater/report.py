@@ -0,0 +1,73 @@
+'''JSON lines report of a parser run.
+
+A record per line, told apart by "type":
+
+    {"type": "lesson", "file": ..., "sheet": ..., "cell": "C14", "group": ...,
+     "problems": ["incomplete"], "raw": ..., "name": ..., "author": ...}
+    {"type": "file", "file": ..., "groups": 40, "total": 1680, ...}
+    {"type": "summary", "files": 30, "groups": 1200, "total": 50400, ...}
+
+"lesson" records are the issues found by `Parser`, every file gets its
+counters and the last line sums up the run.
+'''
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional, Type, Union
+
+if TYPE_CHECKING:
+    from types import TracebackType
+
+    from schedule_bot.updater.parse import ParseResult
+
+BUFFER_SIZE = 1048576  # 1 mb
+
+
+class ReportWriter:
+    def __init__(
+        self, path: Union[str, Path], buffer_size: int = BUFFER_SIZE
+    ) -> None:
+        self.file = open(path, 'w', encoding='utf-8', buffering=buffer_size)
+        self.files = 0
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self.file.write(json.dumps(record, ensure_ascii=False))
+        self.file.write('\n')
+
+    def write_result(self, tablename: str, result: 'ParseResult') -> None:
+        for issue in result.issues:
+            self.write({'type': 'lesson', 'file': tablename, **issue})
+        self.write(
+            {
+                'type': 'file',
+                'file': tablename,
+                'groups': len(result.groups),
+                **result.counter.to_dict(),
+            }
+        )
+        self.files += 1
+
+    def write_summary(self, result: 'ParseResult') -> None:
+        self.write(
+            {
+                'type': 'summary',
+                'files': self.files,
+                'groups': len(result.groups),
+                'lessons': len(result.lessons),
+                'authors': len(result.authors),
+                **result.counter.to_dict(),
+            }
+        )
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> 'ReportWriter':
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        traceback: Optional['TracebackType'],
+    ) -> None:
+        self.close()
@@ -1,16 +1,20 @@
 from hashlib import md5
-from typing import Optional
-
-from aioredis import Redis
+from typing import Any, Dict, Optional
 
 from schedule_bot import REDIS_HOST, REDIS_PORT
 
 
 class FilesStorage:
+    '''Hashes and HTTP validators of the downloaded files.'''
+
     prefix = 'file_'
 
-    def __init__(self) -> None:
-        self.redis = Redis(host=REDIS_HOST, port=REDIS_PORT)
+    def __init__(self, redis: Any = None) -> None:
+        if redis is None:
+            from aioredis import Redis
+
+            redis = Redis(host=REDIS_HOST, port=REDIS_PORT)
+        self.redis = redis
 
     def __keyify(self, file: str) -> str:
         file_hash = md5(file.encode('utf-8')).hexdigest()
@@ -35,3 +39,21 @@ class FilesStorage:
         if value is None:
             return None
         return value.decode('utf-8')
+
+    async def set_validators(
+        self, file: str, validators: Dict[str, str]
+    ) -> None:
+        '''Stores ETag and Last-Modified response headers of the file.'''
+        key = f'{self.__keyify(file)}_http'
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            if validators:
+                pipe.hset(key, mapping=validators)
+            await pipe.execute()
+
+    async def get_validators(self, file: str) -> Dict[str, str]:
+        values = await self.redis.hgetall(f'{self.__keyify(file)}_http')
+        return {
+            name.decode('utf-8'): value.decode('utf-8')
+            for name, value in values.items()
+        }
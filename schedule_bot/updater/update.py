@@ -1,12 +1,289 @@
+'''Non-interactive schedule update: download, parse and load.
+
+    python -m schedule_bot.updater.update --dir ./FILES --jobs 4
+
+Stages are connected by bounded queues: a workbook is parsed as soon as it
+is downloaded and its groups are written to the database while other
+files are still being parsed. Exits with status 1 if any file failed.
+'''
+import argparse
 import asyncio
+import os
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from schedule_bot import DOWNLOAD_CONCURRENCY
+from schedule_bot.updater import Updater, downloader, logger, parse
+from schedule_bot.updater.parse_cache import ParseCache
+from schedule_bot.updater.storage import FilesStorage
+
+Emit = Callable[[Path], Awaitable[None]]
+Fail = Callable[[str], Awaitable[None]]
+Source = Callable[[Emit, Fail], Awaitable[Any]]
+Load = Callable[[parse.Groups], Any]
+Loaded = Callable[[Path], Awaitable[None]]
+Parsed = Tuple[Path, parse.ParseResult]
+
+
+class StageStats:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.files = 0
+        self.failed = 0
+        self.busy = 0.0
+        self.finished = 0.0
+
+    def __str__(self) -> str:
+        return (
+            f'{self.name}: {self.files} files ({self.failed} failed), '
+            f'busy {self.busy:.2f}s, finished at {self.finished:.2f}s'
+        )
+
+
+class UpdatePipeline:
+    '''download -> parse -> load, each stage fed by a bounded queue.
+
+    `source` is awaited with a callback that receives every file to parse
+    (by default the changed files of `downloader.download`) and one that
+    receives the name of every file it failed to provide. Files are
+    parsed by `jobs` workers, in a process pool when `jobs` > 1, and the
+    parsed groups are passed to `load` one file at a time from a thread.
+    `on_loaded` is awaited with every file whose groups were loaded.
+    '''
+
+    def __init__(
+        self,
+        source: Source,
+        load: Load,
+        jobs: int = 1,
+        queue_size: int = 4,
+        cache: Optional[ParseCache] = None,
+        on_loaded: Optional[Loaded] = None,
+    ) -> None:
+        self.source = source
+        self.load = load
+        self.on_loaded = on_loaded
+        self.cache = cache
+        self.jobs = max(jobs, 1)
+        self.queue_size = queue_size
+        self.stats = {
+            name: StageStats(name) for name in ('download', 'parse', 'load')
+        }
+        self._started = 0.0
+
+    def _executor(self) -> Executor:
+        if self.jobs > 1:
+            return ProcessPoolExecutor(self.jobs)
+        return ThreadPoolExecutor(self.jobs)
+
+    def _elapsed(self) -> float:
+        return time.perf_counter() - self._started
+
+    async def _download(self, files: 'asyncio.Queue[Optional[Path]]') -> None:
+        stats = self.stats['download']
+
+        async def emit(path: Path) -> None:
+            stats.files += 1
+            await files.put(path)
+
+        async def fail(name: str) -> None:
+            stats.failed += 1
+
+        started = time.perf_counter()
+        try:
+            await self.source(emit, fail)
+        except Exception:
+            logger.exception('Download failed')
+            stats.failed += 1
+        finally:
+            stats.busy = time.perf_counter() - started
+            stats.finished = self._elapsed()
+            for _ in range(self.jobs):
+                await files.put(None)
 
-from schedule_bot.updater import downloader
+    async def _parse(
+        self,
+        executor: Executor,
+        files: 'asyncio.Queue[Optional[Path]]',
+        results: 'asyncio.Queue[Optional[Parsed]]',
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        stats = self.stats['parse']
+        while (path := await files.get()) is not None:
+            started = time.perf_counter()
+            try:
+                result = await loop.run_in_executor(
+                    executor,
+                    partial(parse.parse_file, str(path), cache=self.cache),
+                )
+            except Exception:
+                logger.exception('Failed to parse %s', path)
+                stats.failed += 1
+                continue
+            finally:
+                stats.busy += time.perf_counter() - started
+            stats.files += 1
+            await results.put((path, result))
+        stats.finished = self._elapsed()
 
+    async def _load(
+        self, results: 'asyncio.Queue[Optional[Parsed]]'
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        stats = self.stats['load']
+        while (parsed := await results.get()) is not None:
+            path, result = parsed
+            groups = result.groups
+            started = time.perf_counter()
+            try:
+                await loop.run_in_executor(None, self.load, groups)
+                if self.on_loaded is not None:
+                    await self.on_loaded(path)
+                stats.files += 1
+            except Exception:
+                logger.exception('Failed to load %s', ', '.join(groups))
+                stats.failed += 1
+            stats.busy += time.perf_counter() - started
+        stats.finished = self._elapsed()
 
-async def main() -> None:
-    result = await downloader.hash_file(__file__)
-    print(result)
+    async def run(self) -> bool:
+        '''Returns False if any file failed.'''
+        self._started = time.perf_counter()
+        files: 'asyncio.Queue[Optional[Path]]' = asyncio.Queue(
+            self.queue_size
+        )
+        results: 'asyncio.Queue[Optional[Parsed]]' = asyncio.Queue(
+            self.queue_size
+        )
+
+        with self._executor() as executor:
+            load = asyncio.create_task(self._load(results))
+            await asyncio.gather(
+                self._download(files),
+                *(
+                    self._parse(executor, files, results)
+                    for _ in range(self.jobs)
+                ),
+            )
+            await results.put(None)
+            await load
+
+        for stats in self.stats.values():
+            logger.info('%s', stats)
+        logger.info('Update finished in %.2fs', self._elapsed())
+        return not any(stats.failed for stats in self.stats.values())
+
+
+def diff_load(groups: parse.Groups) -> Any:
+    '''`Updater.diff_load` that raises when the database write failed.
+
+    `orm_function` logs and swallows database errors, returning None.
+    '''
+    changes = Updater().diff_load(groups)
+    if changes is None:
+        raise RuntimeError('database error, the groups are not loaded')
+    return changes
+
+
+class DownloadSource:
+    '''Emits changed downloads, then with `everything` the other files.
+
+    The hash and HTTP validators of a changed file are saved by `loaded`,
+    so a file that failed to parse or load is downloaded and loaded again
+    by the next run.
+    '''
+
+    def __init__(
+        self,
+        dest: str,
+        everything: bool = False,
+        storage: Optional[FilesStorage] = None,
+        page: str = downloader.SCHEDULE_PAGE,
+    ) -> None:
+        self.dest = dest
+        self.everything = everything
+        self.page = page
+        self.storage = storage if storage is not None else FilesStorage()
+        self.pending: Dict[str, downloader.FileState] = {}
+
+    async def __call__(self, emit: Emit, fail: Fail) -> None:
+        changed = await downloader.download(
+            self.dest,
+            self.storage,
+            self.page,
+            concurrency=DOWNLOAD_CONCURRENCY,
+            on_changed=emit,
+            on_failed=fail,
+            pending=self.pending,
+        )
+        if self.everything:
+            for path in sorted(Path(self.dest).iterdir()):
+                if (
+                    path.suffix.lower() in parse.WORKBOOK_EXTENSIONS
+                    and path not in changed
+                ):
+                    await emit(path)
+
+    async def loaded(self, path: Path) -> None:
+        state = self.pending.pop(path.name, None)
+        if state is not None:
+            await downloader.save_state(self.storage, path.name, state)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argument_parser = argparse.ArgumentParser(
+        description='download, parse and load the ISTU timetables'
+    )
+    argument_parser.add_argument(
+        '-d', '--dir', default='./FILES', help='directory for the workbooks'
+    )
+    argument_parser.add_argument(
+        '-j', '--jobs', type=int, default=1, help='parsing processes'
+    )
+    argument_parser.add_argument(
+        '--queue-size',
+        type=int,
+        default=4,
+        help='files waiting between two stages',
+    )
+    argument_parser.add_argument(
+        '--all',
+        dest='everything',
+        action='store_true',
+        help='parse and load unchanged workbooks too',
+    )
+    argument_parser.add_argument(
+        '--no-cache',
+        dest='cache',
+        action='store_false',
+        help='do not use the parse cache in <dir>/.parse_cache',
+    )
+    args = argument_parser.parse_args(argv)
+
+    cache = None
+    if args.cache:
+        cache_dir = Path(args.dir) / '.parse_cache'
+        cache = ParseCache(cache_dir, parse.PARSER_VERSION)
+        cache.prune()
+
+    source = DownloadSource(args.dir, args.everything)
+    pipeline = UpdatePipeline(
+        source,
+        diff_load,
+        jobs=args.jobs,
+        queue_size=args.queue_size,
+        cache=cache,
+        on_loaded=source.loaded,
+    )
+    return 0 if asyncio.run(pipeline.run()) else 1
 
 
 if __name__ == '__main__':
-    result = asyncio.run(main())
+    if os.name == 'nt':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    sys.exit(main())
@@ -0,0 +1,123 @@
+'''Streaming reader of .xlsx timetables.
+
+The rows are read by openpyxl in read-only mode, which does not build the
+cell objects of the workbook. Read-only worksheets do not know their merged
+ranges, so those are collected from the sheet XML in a separate streaming
+pass. Only one sheet is held in memory at a time.
+
+openpyxl is an optional dependency: pip install schedule-bot[xlsx]
+'''
+import posixpath
+import zipfile
+from typing import IO, Any, Dict, Iterator, List, Tuple
+from xml.etree.ElementTree import iterparse
+
+import numpy as np
+
+# (min_col, min_row, max_col, max_row), 1-based and inclusive
+CellRange = Tuple[int, int, int, int]
+
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = (
+    '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+)
+PACKAGE_REL_NS = (
+    '{http://schemas.openxmlformats.org/package/2006/relationships}'
+)
+
+
+def sheet_paths(archive: zipfile.ZipFile) -> Dict[str, str]:
+    '''Sheet name -> path of its XML part inside the archive.'''
+    targets = {}
+    with archive.open('xl/_rels/workbook.xml.rels') as rels:
+        for _, elem in iterparse(rels):
+            if elem.tag == f'{PACKAGE_REL_NS}Relationship':
+                target = elem.get('Target')
+                if target.startswith('/'):
+                    target = target[1:]
+                else:
+                    target = posixpath.normpath(posixpath.join('xl', target))
+                targets[elem.get('Id')] = target
+
+    paths = {}
+    with archive.open('xl/workbook.xml') as workbook:
+        for _, elem in iterparse(workbook):
+            if elem.tag == f'{MAIN_NS}sheet':
+                paths[elem.get('name')] = targets[elem.get(f'{REL_NS}id')]
+    return paths
+
+
+def merged_ranges(sheet_xml: IO[bytes]) -> List[CellRange]:
+    from openpyxl.utils.cell import range_boundaries
+
+    ranges = []
+    for _, elem in iterparse(sheet_xml):
+        if elem.tag == f'{MAIN_NS}mergeCell':
+            ranges.append(range_boundaries(elem.get('ref')))
+        elif elem.tag == f'{MAIN_NS}row':
+            # the cells are not needed in this pass
+            elem.clear()
+    return ranges
+
+
+def grow(mat: np.ndarray, ncols: int, nrows: int) -> np.ndarray:
+    '''A copy of `mat` at least twice as large along the exceeded axes.'''
+    old_cols, old_rows = mat.shape
+    if ncols > old_cols:
+        ncols = max(ncols, old_cols * 2)
+    if nrows > old_rows:
+        nrows = max(nrows, old_rows * 2)
+    grown: np.ndarray = np.full((ncols, nrows), '', object)
+    grown[:old_cols, :old_rows] = mat
+    return grown
+
+
+def fill_matrix(sheet: Any, ranges: List[CellRange]) -> np.ndarray:
+    '''Column-major matrix of the sheet values filled row by row.
+
+    The matrix is allocated from the sheet dimension and the merged ranges
+    and grows only if the dimension recorded in the file is wrong.
+    '''
+    ncols = max([sheet.max_column or 0] + [r[2] for r in ranges])
+    nrows = max([sheet.max_row or 0] + [r[3] for r in ranges])
+    mat: np.ndarray = np.full((ncols, nrows), '', object)
+    used_cols = used_rows = 0
+    for nrow, row in enumerate(sheet.iter_rows(values_only=True)):
+        if len(row) > mat.shape[0] or nrow >= mat.shape[1]:
+            mat = grow(mat, len(row), nrow + 1)
+        mat[: len(row), nrow] = [
+            '' if value is None else value for value in row
+        ]
+        used_cols = max(used_cols, len(row))
+        used_rows = nrow + 1
+    used_cols = max([used_cols] + [r[2] for r in ranges])
+    used_rows = max([used_rows] + [r[3] for r in ranges])
+    return mat[:used_cols, :used_rows]
+
+
+def read_sheets(tablename: str) -> Iterator[Tuple[str, np.ndarray]]:
+    '''(sheet name, column-major matrix of values) one sheet at a time.
+
+    Every cell of a merged range gets the value of its top left cell and
+    empty cells are '' like in the matrices built from .xls files.
+    '''
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(tablename, read_only=True, data_only=True)
+    try:
+        with zipfile.ZipFile(tablename) as archive:
+            paths = sheet_paths(archive)
+            for sheet in workbook.worksheets:
+                with archive.open(paths[sheet.title]) as sheet_xml:
+                    ranges = merged_ranges(sheet_xml)
+
+                mat = fill_matrix(sheet, ranges)
+
+                for (col_lo, row_lo, col_hi, row_hi) in ranges:
+                    mat[col_lo - 1:col_hi, row_lo - 1:row_hi] = mat[
+                        col_lo - 1, row_lo - 1
+                    ]
+
+                yield sheet.title, mat
+    finally:
+        workbook.close()
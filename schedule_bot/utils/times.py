@@ -1,3 +1,4 @@
+import bisect
 import datetime
 from typing import Literal, Tuple
 
@@ -57,6 +58,24 @@ class Times:
             Times.lesson_ends[lesson_num - 1].strftime(format),
         )
 
+    @staticmethod
+    def lesson_slot(now: datetime.time) -> int:
+        '''Number of the lesson that is going on or comes next.
+
+        Returns `len(lesson_ends) + 1` after the last lesson of the day.
+        '''
+        return bisect.bisect_left(Times.lesson_ends, now) + 1
+
+    @staticmethod
+    def is_lesson_time(lesson_num: int, now: datetime.time) -> bool:
+        if lesson_num < 1 or lesson_num > len(Times.lesson_begins):
+            return False
+        return (
+            Times.lesson_begins[lesson_num - 1]
+            <= now
+            <= Times.lesson_ends[lesson_num - 1]
+        )
+
     @staticmethod
     def today_weekday() -> str:
         return Times.weekdays[datetime.datetime.today().weekday()]
@@ -0,0 +1,71 @@
+import pytest
+import xlwt
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from schedule_bot import Base, db
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, expire_on_commit=False)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def schedule_data(session):
+    group = db.Group('Б22-191-1')
+    other_group = db.Group('Б22-191-2')
+    lesson = db.Lesson('Программирование')
+    second_lesson = db.Lesson('Математический анализ')
+    author = db.Author('Вдовин А.Ю.')
+    lesson_type = db.LessonType('лек')
+    version = db.ScheduleVersion(active=True)
+    session.add(version)
+    session.flush()
+    rows = [
+        db.Schedule(group, lesson, author, lesson_type, 3, 0, True, '122в'),
+        db.Schedule(group, second_lesson, None, None, 1, 0, True, '5-302'),
+        db.Schedule(group, lesson, author, lesson_type, 2, 0, False, '1'),
+        db.Schedule(other_group, lesson, None, None, 1, 1, True, '2'),
+    ]
+    for row in rows:
+        row.generation = version.id
+    session.add_all(rows)
+    session.commit()
+    return session
+
+
+def write_workbook(path, groups):
+    '''Two groups per sheet, the first lesson of each pair merged.'''
+    workbook = xlwt.Workbook()
+    names = list(groups)
+    for sheet_id in range(0, len(names), 2):
+        sheet = workbook.add_sheet(f'sheet{sheet_id}')
+        for col, group in enumerate(names[sheet_id:sheet_id + 2], 1):
+            sheet.write(0, col, f'{group}\nИВТ')
+            for row, lesson in enumerate(groups[group], 1):
+                sheet.write(row, col, lesson)
+        sheet.write_merge(85, 85, 1, 2, 'конец')
+    workbook.save(str(path))
+
+
+@pytest.fixture
+def workbooks(tmp_path):
+    files = []
+    for file_id in range(3):
+        groups = {}
+        for group_id in range(4):
+            lessons = [''] * 84
+            lessons[file_id * 2] = (
+                f'(51) (лекц) Предмет {group_id},  Вдовин А.Ю., 122в'
+            )
+            lessons[20 + group_id] = '(66) (л/р) Физика, Кайсина И.А. 5-302'
+            groups[f'Б22-19{file_id}-{group_id}'] = lessons
+        files.append(tmp_path / f'{file_id}.xls')
+        write_workbook(files[-1], groups)
+    return [str(file) for file in files]
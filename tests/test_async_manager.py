@@ -0,0 +1,211 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from schedule_bot import Base, db
+from schedule_bot.manager import async_manager
+from schedule_bot.manager.cache import UserProfile, user_cache
+
+
+async def _with_session(coro_func):
+    engine = create_async_engine('sqlite+aiosqlite://', poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    try:
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            session.add_all(
+                [
+                    db.Group('Б22-191-1'),
+                    db.ActiveUser(100),
+                    db.ScheduleVersion(active=True),
+                ]
+            )
+            await session.flush()
+            session.add_all(
+                [
+                    db.Schedule(
+                        1,
+                        db.Lesson(name),
+                        None,
+                        None,
+                        num,
+                        0,
+                        True,
+                        '',
+                        generation=1,
+                    )
+                    for name, num in (('A', 4), ('B', 2), ('C', 3))
+                ]
+            )
+            await session.commit()
+            return await coro_func(session)
+    finally:
+        await engine.dispose()
+
+
+@pytest.fixture
+def run():
+    def runner(coro_func):
+        return asyncio.run(_with_session(coro_func))
+
+    return runner
+
+
+def test_set_and_drop_user_group(run):
+    async def scenario(session):
+        await async_manager.set_user_group(100, 'Б22-191-1', session=session)
+        user = await async_manager.get_user(100, session=session)
+        assert user.group_id == 1
+        await async_manager.drop_user_group(100, session=session)
+        session.expunge_all()
+        user = await async_manager.get_user(100, session=session)
+        return user.group_id
+
+    assert run(scenario) is None
+
+
+def test_group_exists(run):
+    async def scenario(session):
+        return (
+            await async_manager.group_exists('Б22-191-1', session=session),
+            await async_manager.group_exists('nope', session=session),
+        )
+
+    assert run(scenario) == (True, False)
+
+
+def test_user_profile_is_cached_and_written_through(run):
+    async def scenario(session):
+        await user_cache.invalidate(100)
+        first = await async_manager.get_user_profile(100, session=session)
+        await async_manager.set_user_group(100, 'Б22-191-1', session=session)
+        await async_manager.set_vip_status_by_telegram_id(
+            100, True, session=session
+        )
+        return first, await user_cache.get(100)
+
+    first, cached = run(scenario)
+    assert first == UserProfile(100, None, None, False)
+    assert cached == UserProfile(100, 1, 'Б22-191-1', True)
+
+
+def test_vip_users_are_grouped(run):
+    async def scenario(session):
+        session.add_all(
+            [
+                db.Group('Б22-191-2'),
+                db.ActiveUser(101, 1),
+                db.ActiveUser(102, 2),
+                db.ActiveUser(103, 1),
+                db.ActiveUser(104),
+            ]
+        )
+        await session.commit()
+        await async_manager.set_user_group(100, 'Б22-191-1', session=session)
+        for tid in (100, 101, 102, 104):
+            await async_manager.set_vip_status_by_telegram_id(
+                tid, True, session=session
+            )
+        return await async_manager.get_vip_users_by_group(session=session)
+
+    groups = run(scenario)
+    assert sorted(groups['Б22-191-1']) == [100, 101]
+    assert groups['Б22-191-2'] == [102]
+    assert len(groups) == 2
+
+
+def test_active_schedule_is_ordered(run):
+    async def scenario(session):
+        session.add(db.ScheduleVersion())
+        await session.commit()
+        return (
+            await async_manager.get_full_schedule(session=session),
+            await async_manager.get_active_version(session=session),
+            await async_manager.get_active_revision(session=session),
+        )
+
+    schedule, version, revision = run(scenario)
+    assert [lesson.num for lesson in schedule] == [2, 3, 4]
+    assert version == 1
+    assert revision == (1, 0)
+
+
+def test_users_are_filtered(run):
+    async def scenario(session):
+        session.add_all([db.ActiveUser(101, 1), db.ActiveUser(102)])
+        await session.commit()
+        await async_manager.add_user(103, session=session)
+        await async_manager.set_vip_status_by_telegram_id(
+            102, True, session=session
+        )
+        return (
+            await async_manager.get_groups(session=session),
+            await async_manager.get_all_users(session=session),
+            await async_manager.get_users_in_groups(
+                ['Б22-191-1'], session=session
+            ),
+            await async_manager.get_all_vip_users(session=session),
+            await async_manager.get_user_settings_by_telegram_id(
+                103, session=session
+            ),
+        )
+
+    groups, users, in_group, vip, settings = run(scenario)
+    assert [group.group for group in groups] == ['Б22-191-1']
+    assert sorted(user.tid for user in users) == [100, 101, 102, 103]
+    assert [user.tid for user in in_group] == [101]
+    assert [user.tid for user in vip] == [102]
+    assert settings == {'vip': False}
+
+
+def test_uncommitted_changes_invalidate_the_cache(run):
+    async def scenario(session):
+        await user_cache.set(UserProfile(100, None, None, False))
+        await async_manager.set_user_group(
+            100, 'Б22-191-1', commit=False, session=session
+        )
+        after_set = await user_cache.get(100)
+        await async_manager.get_user_profile(100, session=session)
+        await async_manager.drop_user_group(
+            100, commit=False, session=session
+        )
+        after_drop = await user_cache.get(100)
+        await async_manager.add_user(101, commit=False, session=session)
+        return after_set, after_drop, await user_cache.get(101)
+
+    assert run(scenario) == (None, None, None)
+
+
+def test_unknown_user_has_no_profile(run):
+    async def scenario(session):
+        return (
+            await async_manager.get_user_profile(999, session=session),
+            await async_manager.get_user_settings_by_telegram_id(
+                999, session=session
+            ),
+        )
+
+    assert run(scenario) == (None, None)
+
+
+def test_database_errors_return_none(monkeypatch):
+    from sqlalchemy.orm import sessionmaker
+
+    from schedule_bot import manager
+
+    async def scenario():
+        # no tables, every query fails
+        engine = create_async_engine('sqlite+aiosqlite://')
+        monkeypatch.setattr(
+            manager,
+            'AsyncSessionCreator',
+            sessionmaker(engine, class_=AsyncSession),
+        )
+        try:
+            return await async_manager.get_groups()
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(scenario()) is None
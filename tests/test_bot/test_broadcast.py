@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+from aiogram.utils import exceptions
+
+from schedule_bot.bot.broadcast import Broadcaster, BroadcastStats, TokenBucket
+
+
+def test_broadcast_counts_sent_and_failed():
+    async def send(chat_id: int, text: str) -> bool:
+        await asyncio.sleep(0.01)
+        return chat_id % 2 == 0
+
+    broadcaster = Broadcaster(send, rate=1000, workers=4, chat_interval=0)
+    stats = asyncio.run(broadcaster.run((i, 'hi') for i in range(10)))
+
+    assert (stats.total, stats.sent, stats.failed) == (10, 5, 5)
+    assert str(stats) == 'отправлено пользователям: 5 из 10'
+
+
+def test_retry_after_pauses_every_worker():
+    sent_at = {}
+    flood = {'raised': False}
+
+    async def send(chat_id: int, text: str) -> bool:
+        if chat_id == 0 and not flood['raised']:
+            await asyncio.sleep(0.01)
+            flood['raised'] = True
+            raise exceptions.RetryAfter(1)
+        sent_at[chat_id] = time.monotonic()
+        return True
+
+    broadcaster = Broadcaster(send, rate=20, workers=4, chat_interval=0)
+    # the other workers wait for a token while chat 0 gets the flood wait
+    broadcaster.bucket = TokenBucket(rate=20, capacity=1)
+    stats = BroadcastStats()
+    started = time.monotonic()
+    asyncio.run(broadcaster.run([(i, 'hi') for i in range(4)], stats))
+
+    assert stats.sent == 4 and stats.retries == 1
+    assert min(sent_at.values()) - started >= 1
+
+
+def test_per_chat_interval():
+    sent_at = []
+
+    async def send(chat_id: int, text: str) -> bool:
+        sent_at.append(time.monotonic())
+        return True
+
+    broadcaster = Broadcaster(send, rate=1000, workers=2, chat_interval=0.2)
+    asyncio.run(broadcaster.run([(1, 'a'), (1, 'b')]))
+
+    assert sent_at[1] - sent_at[0] >= 0.2
+    assert broadcaster._chat_last_sent.keys() == {1}
+    time.sleep(0.2)
+    asyncio.run(broadcaster.run([(2, 'c')]))
+    assert broadcaster._chat_last_sent.keys() == {2}
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+
+    async def scenario():
+        started = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) >= 0.09
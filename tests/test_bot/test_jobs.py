@@ -0,0 +1,134 @@
+import asyncio
+from collections import Counter
+
+import pytest
+from aiogram.utils import exceptions
+from fakeredis import aioredis
+
+from schedule_bot.bot.broadcast import Broadcaster
+from schedule_bot.bot.jobs import BroadcastQueue
+
+
+class Crash(Exception):
+    pass
+
+
+def make_broadcaster(sent, crash_after=None):
+    async def send(chat_id: int, text: str) -> bool:
+        if crash_after is not None and len(sent) >= crash_after:
+            raise Crash()
+        await asyncio.sleep(0)
+        sent.append((chat_id, text))
+        return True
+
+    return Broadcaster(send, rate=10000, workers=1, chat_interval=0)
+
+
+@pytest.fixture
+def redis():
+    return aioredis.FakeRedis()
+
+
+def test_job_is_drained_once(redis):
+    queue = BroadcastQueue(redis, batch_size=4)
+    sent = []
+
+    async def scenario():
+        job_id = await queue.create(
+            [(i, 'a' if i % 2 else 'b') for i in range(10)], name='test'
+        )
+        stats = await queue.drain(job_id, make_broadcaster(sent))
+        return stats, await queue.active_jobs()
+
+    stats, active = asyncio.run(scenario())
+    assert (stats.total, stats.sent, stats.failed) == (10, 10, 0)
+    assert sorted(sent) == [(i, 'a' if i % 2 else 'b') for i in range(10)]
+    assert active == []
+
+
+def test_job_resumes_after_crash(redis):
+    queue = BroadcastQueue(redis, batch_size=10, checkpoint=5)
+    sent = []
+
+    async def scenario():
+        job_id = await queue.create([(i, 'hi') for i in range(12)])
+        with pytest.raises(Crash):
+            await queue.drain(job_id, make_broadcaster(sent, crash_after=7))
+        # the crashed process never refreshes its lease again
+        await redis.delete(*await redis.keys('broadcast_*_lease_*'))
+        assert await queue.active_jobs() == [job_id]
+        await queue.drain_all(make_broadcaster(sent))
+        return await queue.progress(job_id)
+
+    stats = asyncio.run(scenario())
+    deliveries = Counter(tid for tid, _ in sent)
+    assert stats.sent == 12
+    assert set(deliveries) == set(range(12))
+    # only messages after the last checkpoint can be repeated
+    assert all(deliveries[tid] == 1 for tid in range(5))
+    assert sum(deliveries.values()) <= 12 + 5
+
+
+def test_processes_share_one_job(redis):
+    first = BroadcastQueue(redis, batch_size=3)
+    second = BroadcastQueue(redis, batch_size=3)
+    sent = []
+
+    async def scenario():
+        job_id = await first.create([(i, 'hi') for i in range(20)])
+        await asyncio.gather(
+            first.drain(job_id, make_broadcaster(sent)),
+            second.drain(job_id, make_broadcaster(sent)),
+        )
+
+    asyncio.run(scenario())
+    assert sorted(tid for tid, _ in sent) == list(range(20))
+
+
+def test_lease_outlives_flood_wait(redis):
+    first = BroadcastQueue(redis, batch_size=10, lease=1)
+    second = BroadcastQueue(redis, batch_size=10, lease=1)
+    sent = []
+    retried = []
+
+    async def send(chat_id: int, text: str) -> bool:
+        if not retried:
+            retried.append(chat_id)
+            raise exceptions.RetryAfter(2)
+        sent.append((chat_id, text))
+        return True
+
+    async def scenario():
+        job_id = await first.create([(i, 'hi') for i in range(3)])
+        flooded = first.drain(
+            job_id, Broadcaster(send, rate=10000, workers=1, chat_interval=0)
+        )
+
+        async def resume():
+            # the first process is still paused when its lease would expire
+            await asyncio.sleep(1.5)
+            await second.drain(job_id, make_broadcaster(sent))
+
+        await asyncio.gather(flooded, resume())
+
+    asyncio.run(scenario())
+    assert sorted(tid for tid, _ in sent) == [0, 1, 2]
+
+
+def test_job_is_drained_once_per_process(redis):
+    queue = BroadcastQueue(redis, batch_size=2)
+    sent = []
+
+    async def scenario():
+        job_id = await queue.create([(i, 'hi') for i in range(6)])
+        # a resumer of the same process must not join a running drain
+        await asyncio.gather(
+            queue.drain(job_id, make_broadcaster(sent)),
+            queue.drain_all(make_broadcaster(sent)),
+            queue.drain(job_id, make_broadcaster(sent)),
+        )
+        return await queue.progress(job_id)
+
+    stats = asyncio.run(scenario())
+    assert stats.sent == 6
+    assert sorted(tid for tid, _ in sent) == list(range(6))
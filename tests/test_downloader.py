@@ -0,0 +1,194 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+from fakeredis import aioredis
+
+from schedule_bot.updater.downloader import (
+    DownloadError,
+    download,
+    download_file,
+)
+from schedule_bot.updater.storage import FilesStorage
+
+PAGE = '''
+<table class="istu-table"><tbody>
+<tr><td><a href="/files/a.xls">a</a></td></tr>
+<tr><td><a href="/files/b.xls">b</a></td></tr>
+</tbody></table>
+'''
+
+
+class FileServer:
+    '''Serves workbooks, honours If-None-Match and can fail on purpose.'''
+
+    def __init__(self) -> None:
+        self.body = b'workbook v1'
+        self.etag = '"v1"'
+        self.transfers = 0
+        self.failures = 0
+        self.failure_status = 503
+        self.active = 0
+        self.max_active = 0
+        self.runner = None
+        self.url = ''
+
+    async def handle_page(self, request: web.Request) -> web.Response:
+        return web.Response(text=PAGE, content_type='text/html')
+
+    async def handle_file(self, request: web.Request) -> web.Response:
+        if self.failures:
+            self.failures -= 1
+            return web.Response(status=self.failure_status)
+        if request.headers.get('If-None-Match') == self.etag:
+            return web.Response(status=304)
+        self.transfers += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        body = self.body + request.match_info['name'].encode('utf-8')
+        return web.Response(body=body, headers={'ETag': self.etag})
+
+    async def __aenter__(self) -> 'FileServer':
+        app = web.Application()
+        app.router.add_get('/schedule', self.handle_page)
+        app.router.add_get('/files/{name}', self.handle_file)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.url = f'http://127.0.0.1:{port}'
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        await self.runner.cleanup()
+
+
+@pytest.fixture
+def storage():
+    return FilesStorage(aioredis.FakeRedis())
+
+
+def run_with_server(scenario):
+    async def wrapper():
+        async with FileServer() as server:
+            async with aiohttp.ClientSession() as session:
+                return await scenario(server, session)
+
+    return asyncio.run(wrapper())
+
+
+def test_unchanged_file_is_not_transferred(tmp_path, storage):
+    async def scenario(server, session):
+        link = f'{server.url}/files/a.xls'
+        results = []
+        for etag in ('"v1"', '"v1"', '"v2"'):
+            server.etag = etag
+            results.append(
+                await download_file(session, link, 'a.xls', tmp_path, storage)
+            )
+        return results, server.transfers
+
+    results, transfers = run_with_server(scenario)
+    assert results == [True, False, False]
+    assert transfers == 2
+    assert list(tmp_path.iterdir()) == [tmp_path / 'a.xls']
+
+
+def test_changed_content_is_streamed_to_disk(tmp_path, storage):
+    async def scenario(server, session):
+        link = f'{server.url}/files/a.xls'
+        await download_file(session, link, 'a.xls', tmp_path, storage)
+        server.body, server.etag = b'workbook v2' * 100000, '"v2"'
+        changed = await download_file(
+            session, link, 'a.xls', tmp_path, storage
+        )
+        return changed, await storage.get_validators('a.xls')
+
+    changed, validators = run_with_server(scenario)
+    assert changed
+    assert validators == {'ETag': '"v2"'}
+    assert (tmp_path / 'a.xls').read_bytes().endswith(b'v2a.xls')
+
+
+def test_missing_local_file_is_downloaded_again(tmp_path, storage):
+    async def scenario(server, session):
+        link = f'{server.url}/files/a.xls'
+        await download_file(session, link, 'a.xls', tmp_path, storage)
+        (tmp_path / 'a.xls').unlink()
+        return await download_file(session, link, 'a.xls', tmp_path, storage)
+
+    assert run_with_server(scenario) is True
+    assert (tmp_path / 'a.xls').exists()
+
+
+def test_failed_download_is_retried(tmp_path, storage):
+    async def scenario(server, session):
+        server.failures = 2
+        link = f'{server.url}/files/a.xls'
+        return await download_file(
+            session, link, 'a.xls', tmp_path, storage, retries=2, backoff=0
+        )
+
+    assert run_with_server(scenario) is True
+
+
+@pytest.mark.parametrize(
+    'status, retried', [(404, False), (403, False), (429, True), (500, True)]
+)
+def test_only_transient_errors_are_retried(tmp_path, storage, status, retried):
+    async def scenario(server, session):
+        server.failures = 1
+        server.failure_status = status
+        link = f'{server.url}/files/a.xls'
+        try:
+            await download_file(
+                session, link, 'a.xls', tmp_path, storage, retries=2, backoff=0
+            )
+        except aiohttp.ClientResponseError as error:
+            return error.status
+        return server.transfers
+
+    assert run_with_server(scenario) == (1 if retried else status)
+
+
+def test_download_returns_changed_files(tmp_path, storage):
+    async def scenario(server, session):
+        page = f'{server.url}/schedule'
+        first = await download(str(tmp_path), storage, page, concurrency=1)
+        second = await download(str(tmp_path), storage, page, concurrency=1)
+        return first, second, server.max_active
+
+    first, second, max_active = run_with_server(scenario)
+    assert first == [tmp_path / 'a.xls', tmp_path / 'b.xls']
+    assert second == []
+    assert max_active == 1
+
+
+def test_download_reports_failed_files(tmp_path, storage):
+    failed = []
+
+    async def on_failed(name):
+        failed.append(name)
+
+    async def scenario(server, session):
+        server.failures, server.failure_status = 1, 404
+        page = f'{server.url}/schedule'
+        return await download(
+            str(tmp_path), storage, page, concurrency=1, on_failed=on_failed
+        )
+
+    assert run_with_server(scenario) == [tmp_path / 'b.xls']
+    assert failed == ['a.xls']
+
+
+def test_missing_schedule_page_is_an_error(tmp_path, storage):
+    async def scenario(server, session):
+        page = f'{server.url}/missing'
+        with pytest.raises(DownloadError):
+            await download(str(tmp_path), storage, page)
+
+    run_with_server(scenario)
@@ -0,0 +1,96 @@
+import importlib.util
+
+import pytest
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy import create_engine, text
+
+from schedule_bot import WORKDIR
+
+VERSIONS = WORKDIR / 'schedule_bot' / 'migrations' / 'versions'
+
+SLOT_QUERY = (
+    'SELECT * FROM schedule WHERE group_id = 1 AND weekday = 0 '
+    'AND overline = 1 AND num = 1'
+)
+LESSON_QUERY = "SELECT id FROM lessons WHERE name = 'A'"
+
+
+def load_revision(name):
+    path = next(VERSIONS.glob(f'{name}_*.py'))
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def upgrade(connection, revision):
+    context = MigrationContext.configure(connection)
+    with Operations.context(context):
+        load_revision(revision).upgrade()
+
+
+def query_plan(connection, query):
+    rows = connection.execute(text(f'EXPLAIN QUERY PLAN {query}')).all()
+    return ' '.join(row[-1] for row in rows)
+
+
+@pytest.fixture
+def connection():
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        upgrade(connection, '0f28af740d95')
+        connection.execute(
+            text('INSERT INTO groups (id, "group") VALUES (1, \'Б22-191-1\')')
+        )
+        connection.execute(
+            text("INSERT INTO lessons (id, name) VALUES (1, 'A'), (2, 'A')")
+        )
+        connection.execute(
+            text(
+                'INSERT INTO schedule '
+                '(id, group_id, weekday, overline, num, lesson_id) VALUES '
+                '(1, 1, 0, 1, 1, 1), (2, 1, 0, 1, 1, 2), (3, 1, 0, 1, 2, 2)'
+            )
+        )
+        yield connection
+    engine.dispose()
+
+
+def test_indexes_are_used(connection):
+    assert 'SCAN' in query_plan(connection, SLOT_QUERY)
+    assert 'SCAN' in query_plan(connection, LESSON_QUERY)
+
+    upgrade(connection, '3b1f6c2d9a47')
+
+    assert 'USING INDEX ix_schedule_slot' in query_plan(
+        connection, SLOT_QUERY
+    )
+    assert 'INDEX ix_lessons_name' in query_plan(connection, LESSON_QUERY)
+
+
+def test_duplicates_are_removed(connection):
+    upgrade(connection, '3b1f6c2d9a47')
+
+    lessons = connection.execute(text('SELECT id FROM lessons')).all()
+    schedule = connection.execute(
+        text('SELECT id, lesson_id FROM schedule ORDER BY id')
+    ).all()
+    assert lessons == [(1,)]
+    assert schedule == [(2, 1), (3, 1)]
+
+
+def test_existing_rows_become_active_version(connection):
+    upgrade(connection, '3b1f6c2d9a47')
+    upgrade(connection, '7c4e2a91d5b3')
+    upgrade(connection, '5e8a0b7c3f12')
+
+    assert connection.execute(
+        text('SELECT id, active, revision FROM schedule_versions')
+    ).all() == [(1, 1, 0)]
+    assert connection.execute(
+        text('SELECT DISTINCT generation FROM schedule')
+    ).all() == [(1,)]
+    assert 'USING INDEX ix_schedule_slot' in query_plan(
+        connection, SLOT_QUERY + ' AND generation = 1'
+    )
@@ -1,6 +1,31 @@
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pytest
+import xlwt
 
-from schedule_bot.updater.parse import parse_lesson_exp, Lesson
+from benchmarks.workbook import write_workbook
+from schedule_bot.updater import parse
+from schedule_bot.updater.parse import (
+    PARSER_VERSION,
+    Counter,
+    Lesson,
+    Parser,
+    find_groups,
+    iter_tables,
+    parse_file,
+    parse_files,
+    parse_lesson_exp,
+    parse_lesson_line,
+    parse_sheet,
+    parse_table,
+    parser_version,
+)
+from schedule_bot.updater.parse_cache import ParseCache, file_sha1
+from schedule_bot.updater.report import ReportWriter
+from schedule_bot.updater.xlsx import fill_matrix
 
 
 @pytest.mark.parametrize(
@@ -26,3 +51,286 @@ from schedule_bot.updater.parse import parse_lesson_exp, Lesson
 )
 def test_parse(lesson_str: str, expected: Lesson):
     assert parse_lesson_exp(lesson_str) == expected
+
+
+def test_parse_file(workbooks):
+    groups, lessons, authors, counter, issues = parse_file(workbooks[1])
+
+    assert len(groups) == 4
+    assert groups['Б22-191-2'][2] == Lesson(
+        'Предмет 2', 'Вдовин А.Ю.', '122в', 'лек', '51'
+    )
+    assert groups['Б22-191-2'][0] is None
+    assert lessons == {f'Предмет {i}' for i in range(4)} | {'Физика'}
+    assert authors == {'Вдовин А.Ю.', 'Кайсина И.А.'}
+    assert (counter.total, counter.passed) == (8, 8)
+    assert issues == []
+
+
+def test_parse_files_in_processes(workbooks):
+    sequential = list(parse_files(workbooks))
+    parallel = list(parse_files(workbooks, jobs=2))
+
+    assert [result[0] for result in parallel] == [
+        result[0] for result in sequential
+    ]
+    total = Counter()
+    for result in parallel:
+        total.merge(result[3])
+    assert total.total == 24
+
+
+def test_parse_table_expands_merged_cells(workbooks):
+    sheet = next(iter(parse_table(workbooks[0]).values()))
+
+    assert sheet.shape == (3, 86)
+    assert sheet[1][0] == 'Б22-190-0\nИВТ'
+    assert list(sheet[:, 85]) == ['', 'конец', 'конец']
+
+
+def test_find_groups_and_short_columns():
+    sheet = np.full((3, 6), '', object)
+    sheet[0, 0] = 'Понедельник'
+    sheet[1, 0] = 'Б22-191-1\nИВТ'
+    sheet[1, 2] = '(51) (лекц) Программирование,  Вдовин А.Ю., 122в'
+    sheet[2, 1] = 3.0
+    sheet[2, 3] = 'А22-191-2'
+
+    assert [group for _, _, group in find_groups(sheet)] == [
+        'Б22-191-1',
+        'А22-191-2',
+    ]
+    groups = parse_sheet(sheet)
+    assert len(groups['Б22-191-1']) == len(groups['А22-191-2']) == 84
+    assert groups['Б22-191-1'][1].name == 'Программирование'
+    assert groups['А22-191-2'] == [None] * 84
+
+
+def test_lesson_parsing_is_memoized():
+    line = '(51) (лекц) Программирование,  Вдовин А.Ю.,\n122в'
+    parse_lesson_line.cache_clear()
+
+    first = parse_lesson_exp(line)
+    first.name = 'changed'
+    second = parse_lesson_exp(line)
+
+    assert second.name == 'Программирование'
+    assert parse_lesson_line.cache_info().hits == 1
+    assert isinstance(parse_lesson_line(line.replace('\n', ' ')), tuple)
+
+
+def test_parse_summary_reports_cache_hits(workbooks):
+    counter = parse_file(workbooks[0]).counter
+
+    hits, misses = counter.caches['lessons']
+    assert hits + misses == 8
+    # the physics lab line repeats in every group
+    assert hits >= 3
+    assert 'Cache lessons:' in str(counter)
+
+
+def test_parse_cache_reuses_unchanged_files(workbooks, tmp_path):
+    cache = ParseCache(tmp_path / 'cache', PARSER_VERSION)
+    parsed = parse_file(workbooks[0], cache)
+    cached = parse_file(workbooks[0], cache)
+
+    assert cached[0] == parsed[0]
+    assert cached[1:3] == parsed[1:3]
+    assert (cached[3].total, cached[3].cached) == (parsed[3].total, 1)
+    assert 'Cached files: 1' in str(cached[3])
+
+    other = ParseCache(tmp_path / 'cache', 'other')
+    assert other.load(file_sha1(workbooks[0])) is None
+    assert other.prune() == 1
+    assert list((tmp_path / 'cache').iterdir()) == []
+
+
+def test_parse_cache_keeps_report_all_apart(tmp_path):
+    path = str(tmp_path / 'table.xls')
+    lessons = ['(51) (лекц) Программирование, Вдовин А.Ю., 122в'] * 3
+    lessons.append('(51) (лекц) Программирование')
+    workbook = xlwt.Workbook()
+    page = workbook.add_sheet('sheet0')
+    page.write(0, 1, 'Б22-191-1\nИВТ')
+    for row, lesson in enumerate(lessons, 1):
+        page.write(row, 1, lesson)
+    workbook.save(path)
+    cache = ParseCache(tmp_path / 'cache', PARSER_VERSION)
+
+    for _ in range(2):
+        issues = parse_file(path, cache).issues
+        every = parse_file(path, cache, report_all=True).issues
+        assert (len(issues), len(every)) == (1, 4)
+
+
+def test_parser_version_tracks_patterns(monkeypatch):
+    version = parser_version()
+    monkeypatch.setattr(
+        parse, 'GROUP_RE', re.compile(r'[А-Я]\d\d-\d\d\d-\d\d')
+    )
+    assert parser_version() != version
+
+
+def test_parsers_in_threads_are_independent(workbooks):
+    parsers = [Parser() for _ in workbooks]
+    with ThreadPoolExecutor(len(workbooks)) as executor:
+        results = list(executor.map(Parser.parse_file, parsers, workbooks))
+
+    for file_id, (parser, result) in enumerate(zip(parsers, results)):
+        assert sorted(result.groups) == [
+            f'Б22-19{file_id}-{group_id}' for group_id in range(4)
+        ]
+        assert parser.result.groups == result.groups
+        assert result.counter.total == 8
+
+
+def test_parser_accumulates_results(workbooks):
+    parser = Parser(report_all=True)
+    first = parser.parse_file(workbooks[0])
+    parser.parse_file(workbooks[1])
+
+    assert len(first.groups) == 4
+    assert len(parser.result.groups) == 8
+    assert parser.result.counter.total == 16
+    assert len(parser.result.issues) == 16
+    assert first.issues[0] == {
+        'sheet': 'sheet0',
+        'cell': 'B2',
+        'group': 'Б22-190-0',
+        'problems': [],
+        'raw': '(51) (лекц) Предмет 0,  Вдовин А.Ю., 122в',
+        'name': 'Предмет 0',
+        'author': 'Вдовин А.Ю.',
+        'auditory': '122в',
+        'lesson_type': 'лек',
+        'department': '51',
+    }
+
+
+def test_incomplete_lessons_are_reported(workbooks, tmp_path):
+    sheet = np.full((2, 4), '', object)
+    sheet[1, 0] = 'Б22-191-1\nИВТ'
+    sheet[1, 2] = '(51) (лекц) Программирование,\nВдовин А.Ю.'
+    sheet[1, 3] = '(51) Вдовин А.Ю.'
+    parser = Parser()
+    parser.parse_sheet(sheet, 'Лист1')
+
+    issues = parser.result.issues
+    assert [(i['cell'], i['problems']) for i in issues] == [
+        ('B3', ['incomplete']),
+        ('B4', ['incomplete', 'unnamed']),
+    ]
+    assert issues[0]['raw'] == '(51) (лекц) Программирование, Вдовин А.Ю.'
+
+    path = tmp_path / 'report.jsonl'
+    with ReportWriter(path) as report:
+        report.write_result('table.xls', parser.result)
+        report.write_result(workbooks[0], parse_file(workbooks[0]))
+        report.write_summary(parser.result)
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+
+    assert [record['type'] for record in records] == [
+        'lesson',
+        'lesson',
+        'file',
+        'file',
+        'summary',
+    ]
+    assert records[0]['file'] == 'table.xls'
+    assert records[0]['sheet'] == 'Лист1'
+    assert (records[2]['incomplete'], records[2]['unnamed']) == (2, 1)
+    assert records[3]['total'] == 8
+    assert records[-1]['files'] == 2
+
+
+def test_synthetic_workbook_is_parsed(tmp_path):
+    path = str(tmp_path / 'bench.xls')
+    write_workbook(path, sheets=2, groups=6, seed=1)
+    result = parse_file(path)
+
+    assert len(result.groups) == 12
+    assert all(len(lessons) == 84 for lessons in result.groups.values())
+    assert result.counter.total > 100
+    assert result.counter.errors == result.counter.unnamed == 0
+
+
+def test_lessons_are_compact(workbooks):
+    result = Parser().parse_file(workbooks[0])
+    lessons = [
+        lesson
+        for lessons in result.groups.values()
+        for lesson in lessons
+        if lesson is not None
+    ]
+
+    assert not hasattr(lessons[0], '__dict__')
+    assert all(lesson.raw == '' for lesson in lessons)
+    authors = {id(lesson.author) for lesson in lessons}
+    assert len(authors) == len({lesson.author for lesson in lessons})
+
+    shown = Parser(keep_raw=True).parse_file(workbooks[0])
+    assert shown.groups['Б22-190-0'][0].raw.startswith('(51) (лекц)')
+
+
+def write_xlsx(path, groups):
+    '''The layout of `write_workbook` in the .xlsx format.'''
+    openpyxl = pytest.importorskip('openpyxl')
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    names = list(groups)
+    for sheet_id in range(0, len(names), 2):
+        sheet = workbook.create_sheet(f'sheet{sheet_id}')
+        for col, group in enumerate(names[sheet_id:sheet_id + 2], 2):
+            sheet.cell(1, col, f'{group}\nИВТ')
+            for row, lesson in enumerate(groups[group], 2):
+                if lesson:
+                    sheet.cell(row, col, lesson)
+        # a lecture of both groups, every week
+        sheet.cell(4, 2, '(51) (лекц) Программирование,  Вдовин А.Ю., 122в')
+        sheet.merge_cells(start_row=4, start_column=2, end_row=5, end_column=3)
+        sheet.merge_cells('B87:C88')
+    workbook.save(path)
+
+
+def test_xlsx_is_read_like_xls(tmp_path):
+    lessons = [''] * 84
+    lessons[10] = '(66) (л/р) Физика, Кайсина И.А. 5-302'
+    groups = {f'Б22-191-{i}': lessons for i in range(3)}
+    path = str(tmp_path / 'table.xlsx')
+    write_xlsx(path, groups)
+
+    sheets = dict(iter_tables(path))
+    assert [sheet.shape for sheet in sheets.values()] == [(3, 88), (3, 88)]
+    first = sheets['sheet0']
+    assert first[0, 0] == '' and first[1, 0] == 'Б22-191-0\nИВТ'
+    assert first[1, 3] == first[2, 4] != ''
+    assert list(first[:, 87]) == ['', '', '']
+
+    result = parse_file(path)
+    assert sorted(result.groups) == sorted(groups)
+    lecture = Lesson('Программирование', 'Вдовин А.Ю.', '122в', 'лек', '51')
+    assert result.groups['Б22-191-2'][2:4] == [lecture, lecture]
+    assert result.groups['Б22-191-2'][1] is None
+    assert result.groups['Б22-191-2'][10].name == 'Физика'
+    assert result.counter.total == 9
+
+
+class UnsizedSheet:
+    '''A read-only sheet of a file without a dimension record.'''
+
+    max_row = max_column = None
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def iter_rows(self, values_only):
+        return iter(self.rows)
+
+
+def test_xlsx_matrix_grows_without_sheet_dimension():
+    rows = [('a',), (None, None, 'b')] + [(None,)] * 9 + [('c', None)]
+    mat = fill_matrix(UnsizedSheet(rows), [(4, 1, 4, 14)])
+
+    assert mat.shape == (4, 14)
+    assert (mat[0, 0], mat[2, 1], mat[0, 11]) == ('a', 'b', 'c')
+    assert mat[3, 13] == mat[1, 0] == ''
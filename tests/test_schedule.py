@@ -2,8 +2,10 @@ from typing import Tuple
 from datetime import time
 
 import pytest
+from freezegun import freeze_time
 
-from schedule_bot.schedule import num_declination, time_delta
+from schedule_bot.schedule import Schedule, num_declination, time_delta
+from schedule_bot.snapshot import ScheduleSnapshot
 
 
 @pytest.fixture
@@ -36,3 +38,30 @@ def test_num_declination(num: int, answer: str, hour_formats: Tuple[str, ...]):
 )
 def test_time_delta(start: time, end: time, delta: time):
     assert time_delta(start, end) == delta
+
+
+@pytest.fixture
+def schedule(schedule_data):
+    snapshot = ScheduleSnapshot()
+    snapshot.reload(session=schedule_data)
+    return Schedule(snapshot)
+
+
+@pytest.mark.parametrize(
+    ('now', 'current', 'following', 'remain', 'until'),
+    [
+        ('2022-09-12 08:00', None, 1, time(), time(minute=30)),
+        ('2022-09-12 09:00', 1, 3, time(hour=1), time(hour=3, minute=20)),
+        ('2022-09-12 11:00', None, 3, time(), time(hour=1, minute=20)),
+        ('2022-09-12 13:00', 3, None, time(minute=50), time()),
+        ('2022-09-12 21:00', None, None, time(), time()),
+    ]
+)
+def test_now(schedule, now, current, following, remain, until):
+    with freeze_time(now):  # monday, week over line
+        result = schedule.now('Б22-191-1')
+
+    assert (result.now.num if result.now else None) == current
+    assert (result.next.num if result.next else None) == following
+    assert result.remain == remain
+    assert result.until == until
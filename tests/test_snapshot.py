@@ -0,0 +1,111 @@
+import pytest
+
+from schedule_bot import db
+from schedule_bot.manager import manager
+from schedule_bot.schedule import Schedule
+from schedule_bot.snapshot import ScheduleSnapshot
+
+
+def test_snapshot_is_grouped_and_ordered(schedule_data):
+    snapshot = ScheduleSnapshot()
+    snapshot.reload(session=schedule_data)
+
+    day = snapshot.day('Б22-191-1', 0, True)
+    assert [lesson.num for lesson in day] == [1, 3]
+    assert day.nums == [1, 3]
+    assert str(day[1]) == (
+        '3. 12:20 - 13:50\nПрограммирование Вдовин А.Ю. (лек) 122в'
+    )
+    assert day[0].just_name() == 'Математический анализ  5-302'
+    assert len(snapshot.day('Б22-191-1', 0, False)) == 1
+    assert snapshot.day('Б22-191-2', 0, True) == []
+    assert snapshot.day('unknown', 0, True) == []
+    assert snapshot.day('unknown', 0, True).nums == []
+
+
+def test_snapshot_reload_replaces_data(schedule_data):
+    snapshot = ScheduleSnapshot()
+    snapshot.reload(session=schedule_data)
+    assert snapshot.version == 1
+
+    schedule_data.query(db.Schedule).delete()
+    schedule_data.commit()
+    assert len(snapshot.day('Б22-191-1', 0, True)) == 2
+
+    snapshot.reload(session=schedule_data)
+    assert snapshot.version == 2
+    assert snapshot.day('Б22-191-1', 0, True) == []
+
+
+def test_day_schedule_reads_snapshot(schedule_data):
+    snapshot = ScheduleSnapshot()
+    snapshot.reload(session=schedule_data)
+    schedule = Schedule(snapshot)
+
+    assert schedule.day_schedule('Б22-191-2', 1, True) == [
+        '1. 08:30 - 10:00\nПрограммирование 2'
+    ]
+
+
+def test_day_message_is_cached_until_reload(schedule_data):
+    snapshot = ScheduleSnapshot()
+    snapshot.reload(session=schedule_data)
+    schedule = Schedule(snapshot)
+
+    message = schedule.day_message('Б22-191-2', 1, True)
+    assert message == (
+        'Вторник. Над чертой.\n\n1. 08:30 - 10:00\nПрограммирование 2'
+    )
+    assert schedule.day_message('Б22-191-2', 1, True) is message
+    assert schedule.day_message('Б22-191-2', 1, False) == (
+        'Вторник. Под чертой.\n\nВ этот день у вас нет пар'
+    )
+
+    schedule_data.query(db.Schedule).delete()
+    schedule_data.commit()
+    snapshot.reload(session=schedule_data)
+    assert schedule.day_message('Б22-191-2', 1, True).endswith('нет пар')
+
+
+def test_refresh_reloads_only_new_versions(schedule_data):
+    snapshot = ScheduleSnapshot()
+    assert snapshot.refresh(session=schedule_data)
+    assert not snapshot.refresh(session=schedule_data)
+
+    version = db.ScheduleVersion()
+    schedule_data.add(version)
+    schedule_data.flush()
+    schedule_data.query(db.ScheduleVersion).update(
+        {db.ScheduleVersion.active: db.ScheduleVersion.id == version.id}
+    )
+    schedule_data.commit()
+
+    assert snapshot.refresh(session=schedule_data)
+    assert snapshot.version == 2
+    assert snapshot.day('Б22-191-1', 0, True) == []
+
+
+def test_day_requires_loaded_snapshot():
+    snapshot = ScheduleSnapshot()
+    with pytest.raises(RuntimeError):
+        snapshot.day('Б22-191-1', 0, True)
+
+
+def test_refresh_reloads_edited_version(schedule_data):
+    snapshot = ScheduleSnapshot()
+    snapshot.reload(session=schedule_data)
+
+    manager.add_or_upd_schedule(
+        1, 2, None, None, 5, 0, True, '7-404', session=schedule_data
+    )
+    assert snapshot.refresh(session=schedule_data)
+    assert [lesson.num for lesson in snapshot.day('Б22-191-1', 0, True)] == [
+        1,
+        3,
+        5,
+    ]
+
+    manager.delete_schedule(1, 0, True, 5, session=schedule_data)
+    assert snapshot.refresh(session=schedule_data)
+    assert not snapshot.refresh(session=schedule_data)
+    assert len(snapshot.day('Б22-191-1', 0, True)) == 2
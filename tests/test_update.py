@@ -0,0 +1,111 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from fakeredis import aioredis
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from schedule_bot import manager
+from schedule_bot.updater.storage import FilesStorage
+from schedule_bot.updater.update import (
+    DownloadSource,
+    UpdatePipeline,
+    diff_load,
+)
+from tests.test_downloader import FileServer
+
+
+def make_source(files, failed=()):
+    async def source(emit, fail):
+        for file in files:
+            await asyncio.sleep(0)
+            await emit(Path(file))
+        for name in failed:
+            await fail(name)
+
+    return source
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_pipeline_loads_every_file(workbooks, jobs):
+    loaded = []
+    pipeline = UpdatePipeline(
+        make_source(workbooks), loaded.append, jobs=jobs, queue_size=1
+    )
+
+    assert asyncio.run(pipeline.run())
+    assert sorted(group for groups in loaded for group in groups) == sorted(
+        f'Б22-19{file_id}-{group_id}'
+        for file_id in range(3)
+        for group_id in range(4)
+    )
+    assert [stats.files for stats in pipeline.stats.values()] == [3, 3, 3]
+
+
+def test_pipeline_reports_failures(workbooks, tmp_path):
+    broken = tmp_path / 'broken.xls'
+    broken.write_bytes(b'not a workbook')
+    loaded = []
+
+    def load(groups):
+        if 'Б22-190-0' in groups:
+            raise RuntimeError('database is gone')
+        loaded.append(groups)
+
+    pipeline = UpdatePipeline(make_source([broken, *workbooks]), load)
+
+    assert not asyncio.run(pipeline.run())
+    assert pipeline.stats['parse'].failed == 1
+    assert pipeline.stats['load'].failed == 1
+    assert len(loaded) == 2
+
+
+def test_pipeline_reports_database_errors(workbooks, monkeypatch):
+    # a database without tables: every query fails inside orm_function
+    engine = create_engine('sqlite://')
+    monkeypatch.setattr(manager, 'SessionCreator', sessionmaker(engine))
+    pipeline = UpdatePipeline(make_source(workbooks[:1]), diff_load)
+
+    assert not asyncio.run(pipeline.run())
+    assert pipeline.stats['load'].failed == 1
+    assert pipeline.stats['load'].files == 0
+
+
+def test_pipeline_reports_failed_downloads(workbooks):
+    loaded = []
+    pipeline = UpdatePipeline(
+        make_source(workbooks[:1], failed=['a.xls', 'b.xls']), loaded.append
+    )
+
+    assert not asyncio.run(pipeline.run())
+    assert pipeline.stats['download'].failed == 2
+    assert pipeline.stats['download'].files == 1
+    assert len(loaded) == 1
+
+
+def test_download_state_is_saved_after_load(tmp_path):
+    storage = FilesStorage(aioredis.FakeRedis())
+
+    async def scenario():
+        async with FileServer() as server:
+            source = DownloadSource(
+                str(tmp_path), storage=storage, page=f'{server.url}/schedule'
+            )
+            runs = []
+            for _ in range(2):
+                # the served files are not workbooks and fail to parse
+                pipeline = UpdatePipeline(
+                    source, list, on_loaded=source.loaded
+                )
+                await pipeline.run()
+                runs.append(pipeline.stats['download'].files)
+            unsaved = await storage.get('a.xls')
+            await source.loaded(tmp_path / 'a.xls')
+            return runs, unsaved, server.transfers
+
+    runs, unsaved, transfers = asyncio.run(scenario())
+    assert runs == [2, 2]
+    assert unsaved is None
+    assert transfers == 4
+    assert asyncio.run(storage.get_validators('a.xls')) == {'ETag': '"v1"'}
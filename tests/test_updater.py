@@ -0,0 +1,136 @@
+import pytest
+
+from schedule_bot import db
+from schedule_bot.manager import manager
+from schedule_bot.updater import GroupChanges, Updater, lesson_slot
+from schedule_bot.updater.parse import Lesson
+
+
+def make_groups():
+    first = [None] * 84
+    first[0] = Lesson('Программирование', 'Вдовин А.Ю.', '122в', 'лек', '51')
+    first[3] = Lesson('Физика', None, '5-302', 'лаб', '66')
+    second = [None] * 84
+    second[15] = Lesson('Физика', 'Кайсина И.А.', '1-301', 'неизвестно', '21')
+    return {'Б22-191-1': first, 'Б22-191-2': second}
+
+
+def test_lesson_slot():
+    assert lesson_slot(0) == (0, 1, True)
+    assert lesson_slot(3) == (0, 2, False)
+    assert lesson_slot(15) == (1, 1, False)
+    assert lesson_slot(83) == (5, 7, False)
+
+
+def test_bulk_load_inserts_missing_dimensions(session):
+    session.add_all([db.LessonType('лек'), db.LessonType('лаб')])
+    session.add(db.Lesson('Физика'))
+    session.commit()
+
+    assert Updater().bulk_load(make_groups(), session=session) == 3
+
+    assert sorted(name for name, in session.query(db.Lesson.name)) == [
+        'Программирование',
+        'Физика',
+    ]
+    assert session.query(db.Author).count() == 2
+    assert session.query(db.Group).count() == 2
+    rows = {
+        (row.group.group, row.weekday, row.num, row.overline): row
+        for row in session.query(db.Schedule)
+    }
+    physics = rows[('Б22-191-1', 0, 2, False)]
+    assert physics.lesson.name == 'Физика' and physics.author is None
+    assert physics.lesson_type.type == 'лаб'
+    assert rows[('Б22-191-2', 1, 1, False)].lesson_type is None
+
+
+def test_bulk_load_replaces_loaded_groups(session):
+    updater = Updater()
+    updater.bulk_load(make_groups(), session=session)
+    groups = make_groups()
+    del groups['Б22-191-2']
+    groups['Б22-191-1'][0] = None
+
+    assert updater.bulk_load(groups, session=session) == 1
+    assert session.query(db.Schedule).count() == 2
+
+
+def test_bulk_load_publishes_new_version(session):
+    updater = Updater()
+    updater.bulk_load(make_groups(), session=session)
+    first = manager.get_active_version(session=session)
+    groups = make_groups()
+    groups['Б22-191-1'][0] = None
+
+    assert updater.bulk_load(groups, replace_all=True, session=session) == 2
+    assert manager.get_active_version(session=session) != first
+    assert session.query(db.ScheduleVersion).count() == 1
+    assert {row.generation for row in session.query(db.Schedule)} == {
+        manager.get_active_version(session=session)
+    }
+
+
+def test_staged_version_is_hidden_until_published(session):
+    updater = Updater()
+    updater.bulk_load(make_groups(), session=session)
+    groups = make_groups()
+    groups['Б22-191-2'][15] = None
+    groups['Б22-191-2'][16] = Lesson('Химия', None, '1', 'лек', '1')
+
+    version = updater.stage(groups, session=session)
+    assert sorted(
+        row.lesson.name for row in manager.get_full_schedule(session=session)
+    ) == ['Программирование', 'Физика', 'Физика']
+
+    updater.publish(version, session=session)
+    assert sorted(
+        row.lesson.name for row in manager.get_full_schedule(session=session)
+    ) == ['Программирование', 'Физика', 'Химия']
+
+
+def test_bulk_load_rejects_incomplete_schedule(session):
+    updater = Updater()
+    updater.bulk_load(make_groups(), session=session)
+    active = manager.get_active_version(session=session)
+    groups = {'Б22-191-1': [None] * 84}
+
+    with pytest.raises(ValueError):
+        updater.bulk_load(groups, replace_all=True, session=session)
+    assert manager.get_active_version(session=session) == active
+    assert session.query(db.ScheduleVersion).count() == 1
+    assert len(manager.get_full_schedule(session=session)) == 3
+
+
+def test_diff_load_applies_only_changes(session):
+    updater = Updater()
+    changes = updater.diff_load(make_groups(), session=session)
+    assert changes == {
+        'Б22-191-1': GroupChanges(inserted=2),
+        'Б22-191-2': GroupChanges(inserted=1),
+    }
+    ids = {
+        (row.group_id, row.num): row.id for row in session.query(db.Schedule)
+    }
+
+    groups = make_groups()
+    groups['Б22-191-1'][3] = None
+    groups['Б22-191-1'][5] = Lesson('Физика', None, '5-302', 'лаб', '66')
+    groups['Б22-191-2'][15].auditory = '1'
+    changes = updater.diff_load(groups, session=session)
+
+    assert changes['Б22-191-1'] == GroupChanges(1, 0, 1)
+    assert changes['Б22-191-2'] == GroupChanges(0, 1, 0)
+    assert str(changes['Б22-191-1']) == '+1 ~0 -1'
+    rows = {
+        (row.group.group, row.num): row for row in session.query(db.Schedule)
+    }
+    second = rows['Б22-191-2', 1]
+    assert second.id == ids[second.group_id, 1] and second.classroom == '1'
+    assert not rows['Б22-191-1', 3].overline
+    assert ('Б22-191-1', 2) not in rows
+    assert manager.get_active_revision(session=session)[1] == 2
+
+    changes = updater.diff_load(groups, session=session)
+    assert set(changes.values()) == {GroupChanges()}
+    assert manager.get_active_revision(session=session)[1] == 2
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+from fakeredis.aioredis import FakeRedis
+
+from schedule_bot.manager.cache import UserCache, UserProfile
+
+
+def test_cache_evicts_least_recently_used():
+    cache = UserCache(maxsize=2)
+
+    async def scenario():
+        await cache.set(UserProfile(1, None, None, False))
+        await cache.set(UserProfile(2, None, None, False))
+        await cache.get(1)
+        await cache.set(UserProfile(3, None, None, False))
+        return [await cache.get(tid) is not None for tid in (1, 2, 3)]
+
+    assert asyncio.run(scenario()) == [True, False, True]
+    assert len(cache) == 2
+
+
+def test_cache_entries_expire():
+    cache = UserCache(ttl=-1)
+
+    async def scenario():
+        await cache.set(UserProfile(1, None, None, False))
+        return await cache.get(1)
+
+    assert asyncio.run(scenario()) is None
+    assert len(cache) == 0
+
+
+def test_update_writes_through_only_cached_profiles():
+    cache = UserCache()
+
+    async def scenario():
+        await cache.set(UserProfile(1, None, None, False))
+        await cache.update(1, group_id=5, group='Б22-191-1')
+        await cache.update(2, vip=True)
+        return await cache.get(1), await cache.get(2)
+
+    assert asyncio.run(scenario()) == (
+        UserProfile(1, 5, 'Б22-191-1', False),
+        None,
+    )
+
+
+def test_processes_sharing_redis_see_each_other_writes():
+    redis = FakeRedis()
+    first, second = UserCache(redis=redis), UserCache(redis=redis)
+
+    async def scenario():
+        await first.set(UserProfile(1, None, None, False))
+        assert await second.get(1) == UserProfile(1, None, None, False)
+        await second.update(1, group_id=5, group='Б22-191-1')
+        return await first.get(1)
+
+    assert asyncio.run(scenario()) == UserProfile(1, 5, 'Б22-191-1', False)
+    assert len(first) == len(second) == 0
+
+
+@pytest.mark.parametrize('redis', [False, True])
+def test_slow_reads_do_not_overwrite_newer_writes(redis):
+    cache = UserCache(redis=FakeRedis() if redis else None)
+    stale = UserProfile(1, None, None, False)
+    fresh = UserProfile(1, 5, 'Б22-191-1', False)
+
+    async def scenario():
+        # a database read starts, a write goes through, the read finishes
+        generation = await cache.generation(1)
+        await cache.set(fresh)
+        await cache.fill(stale, generation)
+        after_write = await cache.get(1)
+
+        generation = await cache.generation(1)
+        await cache.invalidate(1)
+        await cache.fill(stale, generation)
+        after_invalidate = await cache.get(1)
+
+        generation = await cache.generation(1)
+        await cache.fill(fresh, generation)
+        return after_write, after_invalidate, await cache.get(1)
+
+    assert asyncio.run(scenario()) == (fresh, None, fresh)
@@ -1,3 +1,5 @@
+from datetime import time
+
 from freezegun import freeze_time
 import pytest
 
@@ -40,3 +42,19 @@ def test_lesson_time_with_invalid_lesson_num():
 
     with pytest.raises(IndexError):
         Times.lesson_time(99)
+
+
+@pytest.mark.parametrize(
+    ('now', 'slot', 'in_lesson'),
+    [
+        (time(7, 0), 1, False),
+        (time(8, 30), 1, True),
+        (time(10, 5), 2, False),
+        (time(11, 40), 2, True),
+        (time(20, 30), 7, True),
+        (time(21, 0), 8, False),
+    ]
+)
+def test_lesson_slot(now: time, slot: int, in_lesson: bool):
+    assert Times.lesson_slot(now) == slot
+    assert Times.is_lesson_time(slot, now) is in_lesson